@@ -0,0 +1,122 @@
+import time
+from sqlalchemy import insert
+from db.models import Course, Student, CourseStudent
+
+# Rows per multi-row INSERT statement (keeps bind params well under PostgreSQL's 65535 cap)
+STATEMENT_ROWS = 1000
+
+
+class BulkIngestor:
+    """
+    Batches the parsed entities of one XML upload and writes each table with
+    multi-row INSERT statements instead of one add()/flush() round-trip per row.
+
+    Courses and students are inserted with INSERT ... RETURNING so their ids are
+    resolved in bulk; course_students rows are written once both ends are known.
+    """
+
+    def __init__(self, db, xml_file_id, batch_size=5000):
+        self.db = db
+        self.xml_file_id = xml_file_id
+        self.batch_size = batch_size
+
+        self.course_ids = {}    # course_code -> courses.id
+        self.student_ids = {}   # student_id1 -> students.id
+
+        self._pending_courses = {}
+        self._pending_students = {}
+        self._pending_links = []
+        self._seen_links = set()
+
+        self.courses_written = 0
+        self.students_written = 0
+        self.links_written = 0
+        self._t0 = time.perf_counter()
+
+    # -------------------------
+    # Collect
+    # -------------------------
+    def has_course(self, course_code):
+        return course_code in self.course_ids or course_code in self._pending_courses
+
+    def register_course(self, course_code, course_id):
+        """Map a code to a course row that already exists (e.g. from the regular upload)."""
+        self.course_ids[course_code] = course_id
+
+    def add_course(self, course_code, course_name, section):
+        if self.has_course(course_code):
+            return
+        self._pending_courses[course_code] = {
+            "course_code": course_code,
+            "course_name": course_name,
+            "section": section,
+            "xml_file_id": self.xml_file_id,
+        }
+
+    def add_student(self, student_id, name, major):
+        if student_id in self.student_ids or student_id in self._pending_students:
+            return
+        self._pending_students[student_id] = {
+            "student_id1": student_id,
+            "name": name,
+            "major": major,
+            "xml_file_id": self.xml_file_id,
+        }
+
+    def add_link(self, course_code, student_id):
+        key = (course_code, student_id)
+        if key in self._seen_links:
+            return
+        self._seen_links.add(key)
+        self._pending_links.append(key)
+        if len(self._pending_links) >= self.batch_size:
+            self.flush()
+
+    # -------------------------
+    # Write
+    # -------------------------
+    def _insert_returning(self, table, key_col, rows):
+        ids = {}
+        for i in range(0, len(rows), STATEMENT_ROWS):
+            chunk = rows[i:i + STATEMENT_ROWS]
+            result = self.db.execute(
+                insert(table).values(chunk).returning(table.c.id, table.c[key_col])
+            )
+            for row_id, key in result:
+                ids[key] = row_id
+        return ids
+
+    def flush(self):
+        if self._pending_courses:
+            rows = list(self._pending_courses.values())
+            self.course_ids.update(self._insert_returning(Course.__table__, "course_code", rows))
+            self.courses_written += len(rows)
+            self._pending_courses.clear()
+
+        if self._pending_students:
+            rows = list(self._pending_students.values())
+            self.student_ids.update(self._insert_returning(Student.__table__, "student_id1", rows))
+            self.students_written += len(rows)
+            self._pending_students.clear()
+
+        if self._pending_links:
+            rows = [
+                {"course_id": self.course_ids[code], "student_id": self.student_ids[sid]}
+                for code, sid in self._pending_links
+            ]
+            table = CourseStudent.__table__
+            for i in range(0, len(rows), STATEMENT_ROWS):
+                self.db.execute(insert(table).values(rows[i:i + STATEMENT_ROWS]))
+            self.links_written += len(rows)
+            self._pending_links.clear()
+
+    # -------------------------
+    # Stats
+    # -------------------------
+    @property
+    def rows_written(self):
+        return self.courses_written + self.students_written + self.links_written
+
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self._t0
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,115 @@
+import time
+import numpy as np
+
+
+def _bitsets(conflict_graph, vertices):
+    """Neighbor bitsets restricted to `vertices`, renumbered 0..k-1 in the given order."""
+    index = {int(c): i for i, c in enumerate(vertices)}
+    bits = []
+    for c in vertices:
+        b = 0
+        for n in conflict_graph.neighbors_of(c).tolist():
+            i = index.get(n)
+            if i is not None:
+                b |= 1 << i
+        bits.append(b)
+    return bits
+
+
+def _iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _greedy_clique(bits, starts):
+    """Grow a clique from each start vertex, always adding the candidate with most candidate neighbors."""
+    best = []
+    for v in starts:
+        clique, cand = [v], bits[v]
+        while cand:
+            u = max(_iter_bits(cand), key=lambda x: (bits[x] & cand).bit_count())
+            clique.append(u)
+            cand &= bits[u]
+        if len(clique) > len(best):
+            best = clique
+    return best
+
+
+def _color_bound(bits, cand):
+    """
+    Greedy sequential coloring of the candidate set (MCQ): returns vertices with the
+    color class each landed in; a clique inside cand can use at most one vertex per class.
+    """
+    order, colors = [], []
+    uncolored = cand
+    color = 0
+    while uncolored:
+        color += 1
+        available = uncolored
+        while available:
+            v = (available & -available).bit_length() - 1
+            available &= ~bits[v] & ~(1 << v)
+            uncolored &= ~(1 << v)
+            order.append(v)
+            colors.append(color)
+    return order, colors
+
+
+def clique_lower_bound(conflict_graph, node_limit=200_000, time_limit_seconds=5.0):
+    """
+    Size of a large clique in the conflict graph: every course in a clique needs its own
+    day, so no schedule fits in fewer days. A greedy pass gives the starting clique and a
+    bounded branch-and-bound (MCQ-style coloring bound on bitsets) tries to enlarge it.
+
+    Returns (size, clique course ids, exact) where exact means the search finished and
+    size is the clique number, not just a lower bound on it.
+    """
+    t0 = time.time()
+    degrees = conflict_graph.degrees
+    if conflict_graph.num_courses == 0:
+        return 0, [], True
+    if conflict_graph.num_edges == 0:
+        return 1, [0], True
+
+    # Greedy on the densest part of the graph
+    top = np.argsort(-degrees, kind="stable")[:512]
+    bits = _bitsets(conflict_graph, top)
+    greedy = _greedy_clique(bits, range(min(32, len(top))))
+    best = [int(top[i]) for i in greedy]
+
+    # A clique bigger than |best| only uses courses with degree >= |best|
+    vertices = np.flatnonzero(degrees >= len(best))
+    vertices = vertices[np.argsort(-degrees[vertices], kind="stable")]
+    bits = _bitsets(conflict_graph, vertices)
+    best_local = None
+    nodes = 0
+    exact = True
+
+    def expand(clique, cand):
+        nonlocal best_local, nodes, exact
+        order, colors = _color_bound(bits, cand)
+        for v, color in zip(reversed(order), reversed(colors)):
+            if len(clique) + color <= max(len(best), len(best_local or ())):
+                return
+            nodes += 1
+            if nodes > node_limit or (nodes % 1024 == 0 and time.time() - t0 > time_limit_seconds):
+                exact = False
+                return
+            new_cand = cand & bits[v]
+            if new_cand:
+                expand(clique + [v], new_cand)
+                if not exact:
+                    return
+            elif len(clique) + 1 > max(len(best), len(best_local or ())):
+                best_local = clique + [v]
+            cand &= ~(1 << v)
+
+    expand([], (1 << len(vertices)) - 1)
+    if best_local is not None and len(best_local) > len(best):
+        best = [int(vertices[i]) for i in best_local]
+
+    print(f"🔺 [clique] lower bound={len(best)} ({'exact' if exact else 'bounded'} search, "
+          f"{nodes} nodes, {time.time() - t0:.2f}s)", flush=True)
+    return len(best), best, exact
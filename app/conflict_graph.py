@@ -0,0 +1,92 @@
+import numpy as np
+from app.enrollment import CSRMapping
+
+
+class ConflictGraph:
+    """
+    Course x course co-enrollment graph in CSR form.
+    neighbors[ptr[c]:ptr[c + 1]] are the (sorted) courses sharing a student with c and
+    weights[ptr[c]:ptr[c + 1]] how many students each pair has in common; the solvers
+    see the weights through weighted_degrees (DSATUR and repair_3_in_3 tie-breaks).
+    """
+
+    def __init__(self, ptr, neighbors, weights):
+        self.ptr = ptr
+        self.neighbors = neighbors
+        self.weights = weights
+
+    @property
+    def num_courses(self):
+        return len(self.ptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.neighbors) // 2
+
+    @property
+    def degrees(self):
+        return np.diff(self.ptr)
+
+    @property
+    def weighted_degrees(self):
+        """Total shared students per course (sum of its edge weights)."""
+        rows = np.repeat(np.arange(self.num_courses), self.degrees)
+        return np.bincount(rows, weights=self.weights, minlength=self.num_courses).astype(np.int64)
+
+    def neighbors_of(self, c):
+        return self.neighbors[self.ptr[c]:self.ptr[c + 1]]
+
+    def as_mapping(self):
+        """dict-like course id -> [neighbor ids] view, the conflict_map shape the solvers take."""
+        return CSRMapping(self.ptr, self.neighbors)
+
+
+def _co_enrollment_scipy(enrollment):
+    from scipy import sparse
+
+    incidence = sparse.csr_matrix(
+        (np.ones(enrollment.num_memberships, dtype=np.int32), enrollment.student_courses, enrollment.student_ptr),
+        shape=(enrollment.num_students, enrollment.num_courses),
+    )
+    co = (incidence.T @ incidence).tocsr()
+    co.setdiag(0)
+    co.eliminate_zeros()
+    co.sort_indices()
+    return co.indptr.astype(np.int32), co.indices.astype(np.int32), co.data.astype(np.int32)
+
+
+def _co_enrollment_numpy(enrollment):
+    """Same result without scipy: expand each student's course pairs, grouped by course load."""
+    num_courses = enrollment.num_courses
+    loads = enrollment.student_loads
+    keys = []
+    for k in np.unique(loads[loads >= 2]):
+        students = np.flatnonzero(loads == k)
+        rows = enrollment.student_courses[enrollment.student_ptr[students][:, None] + np.arange(k)]
+        i, j = np.triu_indices(k, 1)
+        a, b = rows[:, i].ravel().astype(np.int64), rows[:, j].ravel().astype(np.int64)
+        keys.append(a * num_courses + b)
+        keys.append(b * num_courses + a)
+
+    if keys:
+        pairs, counts = np.unique(np.concatenate(keys), return_counts=True)
+    else:
+        pairs, counts = np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    rows = (pairs // max(num_courses, 1)).astype(np.int32)
+    ptr = np.zeros(num_courses + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=num_courses), out=ptr[1:])
+    return ptr, (pairs % max(num_courses, 1)).astype(np.int32), counts.astype(np.int32)
+
+
+def build_conflict_graph(enrollment):
+    """
+    Co-enrollment matrix as the sparse product Aᵀ·A of the student x course
+    incidence matrix A: the off-diagonal pattern is the conflict adjacency and the
+    values are the number of students each pair of courses shares.
+    """
+    try:
+        ptr, neighbors, weights = _co_enrollment_scipy(enrollment)
+    except ImportError:
+        ptr, neighbors, weights = _co_enrollment_numpy(enrollment)
+    return ConflictGraph(ptr, neighbors, weights)
@@ -0,0 +1,200 @@
+from collections.abc import Mapping
+import numpy as np
+
+
+def _csr(rows, num_rows):
+    """Row pointer array for pairs already sorted by row."""
+    ptr = np.zeros(num_rows + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=ptr[1:])
+    return ptr
+
+
+class CSRMapping(Mapping):
+    """Read-only dict-like view: dense id -> list of member ids (plain ints)."""
+
+    def __init__(self, ptr, members):
+        self._ptr = ptr
+        self._members = members
+
+    def __getitem__(self, i):
+        if not isinstance(i, (int, np.integer)) or not 0 <= i < len(self._ptr) - 1:
+            raise KeyError(i)
+        return self._members[self._ptr[i]:self._ptr[i + 1]].tolist()
+
+    def __iter__(self):
+        return iter(range(len(self._ptr) - 1))
+
+    def __len__(self):
+        return len(self._ptr) - 1
+
+    def arrays(self):
+        """(ptr, members): the backing CSR arrays, e.g. to hand them to another process."""
+        return self._ptr, self._members
+
+
+class _KeyedMapping(Mapping):
+    """Read-only dict-like view over original keys: key -> set of member keys (built on access)."""
+
+    def __init__(self, keys, index, ptr, members, member_keys):
+        self._keys = keys
+        self._index = index
+        self._ptr = ptr
+        self._members = members
+        self._member_keys = member_keys
+
+    def __getitem__(self, key):
+        i = self._index[key]
+        return {self._member_keys[m] for m in self._members[self._ptr[i]:self._ptr[i + 1]]}
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Enrollment:
+    """
+    Course/student memberships interned to dense integer ids.
+
+    course_keys[i] / student_keys[j] hold the original keys (e.g. (code, name) tuples
+    and student-ID strings). Memberships are stored as int32 CSR arrays in both
+    directions:
+      students of course i: course_students[course_ptr[i]:course_ptr[i + 1]]
+      courses of student j: student_courses[student_ptr[j]:student_ptr[j + 1]]
+    Both member lists are sorted and free of duplicates.
+    """
+
+    def __init__(self, course_keys, student_keys, course_ptr, course_students, student_ptr, student_courses):
+        self.course_keys = course_keys
+        self.student_keys = student_keys
+        self.course_ptr = course_ptr
+        self.course_students = course_students
+        self.student_ptr = student_ptr
+        self.student_courses = student_courses
+        self._course_index = None
+        self._student_index = None
+
+    # -------------------------
+    # Construction
+    # -------------------------
+    @classmethod
+    def from_pairs(cls, course_keys, student_keys, pair_courses, pair_students):
+        """
+        course_keys / student_keys: lists of original keys (position = dense id)
+        pair_courses / pair_students: parallel sequences of dense ids, one per membership
+        """
+        num_courses, num_students = len(course_keys), len(student_keys)
+        pc = np.asarray(pair_courses, dtype=np.int64)
+        ps = np.asarray(pair_students, dtype=np.int64)
+
+        # One sort + dedupe gives course-major order directly
+        flat = np.unique(pc * max(num_students, 1) + ps)
+        pc = (flat // max(num_students, 1)).astype(np.int32)
+        ps = (flat % max(num_students, 1)).astype(np.int32)
+
+        course_ptr = _csr(pc, num_courses)
+        order = np.argsort(ps, kind="stable")
+        student_courses = pc[order]
+        student_ptr = _csr(ps[order], num_students)
+
+        return cls(list(course_keys), list(student_keys), course_ptr, ps, student_ptr, student_courses)
+
+    @classmethod
+    def from_mapping(cls, course_to_students):
+        """Intern a dict-of-sets {course_key: {student_key, ...}}."""
+        course_keys = list(course_to_students.keys())
+        student_index = {}
+        pair_courses, pair_students = [], []
+        for c, students in enumerate(course_to_students.values()):
+            for stu in students:
+                pair_courses.append(c)
+                pair_students.append(student_index.setdefault(stu, len(student_index)))
+        return cls.from_pairs(course_keys, list(student_index), pair_courses, pair_students)
+
+    def map_courses(self, key_fn):
+        """
+        New Enrollment whose course keys are key_fn(old_key); courses mapping to the
+        same key are merged (their student lists are unioned).
+        """
+        new_index = {}
+        remap = np.empty(self.num_courses, dtype=np.int32)
+        for i, key in enumerate(self.course_keys):
+            remap[i] = new_index.setdefault(key_fn(key), len(new_index))
+
+        pair_courses = remap[np.repeat(np.arange(self.num_courses, dtype=np.int32), self.course_sizes)]
+        return Enrollment.from_pairs(list(new_index), self.student_keys, pair_courses, self.course_students)
+
+    # -------------------------
+    # Access
+    # -------------------------
+    @property
+    def num_courses(self):
+        return len(self.course_keys)
+
+    @property
+    def num_students(self):
+        return len(self.student_keys)
+
+    @property
+    def num_memberships(self):
+        return len(self.course_students)
+
+    @property
+    def course_sizes(self):
+        return np.diff(self.course_ptr)
+
+    @property
+    def student_loads(self):
+        return np.diff(self.student_ptr)
+
+    @property
+    def course_index(self):
+        if self._course_index is None:
+            self._course_index = {k: i for i, k in enumerate(self.course_keys)}
+        return self._course_index
+
+    @property
+    def student_index(self):
+        if self._student_index is None:
+            self._student_index = {k: i for i, k in enumerate(self.student_keys)}
+        return self._student_index
+
+    def students_of(self, c):
+        return self.course_students[self.course_ptr[c]:self.course_ptr[c + 1]]
+
+    def courses_of(self, s):
+        return self.student_courses[self.student_ptr[s]:self.student_ptr[s + 1]]
+
+    def course_members(self):
+        """dict-like view course id -> [student ids] for the integer-keyed algorithms."""
+        return CSRMapping(self.course_ptr, self.course_students)
+
+    def student_members(self):
+        """dict-like view student id -> [course ids] for the integer-keyed algorithms."""
+        return CSRMapping(self.student_ptr, self.student_courses)
+
+    def course_key_mapping(self):
+        """dict-like view course key -> {student keys}, matching the old course_to_students."""
+        return _KeyedMapping(self.course_keys, self.course_index, self.course_ptr,
+                             self.course_students, self.student_keys)
+
+    def student_key_mapping(self):
+        """dict-like view student key -> {course keys}, matching the old student_to_courses."""
+        return _KeyedMapping(self.student_keys, self.student_index, self.student_ptr,
+                             self.student_courses, self.course_keys)
+
+    def to_arrays(self):
+        """Plain-array form for on-disk snapshots; keys are returned as lists."""
+        return {
+            "course_ptr": self.course_ptr,
+            "course_students": self.course_students,
+            "student_ptr": self.student_ptr,
+            "student_courses": self.student_courses,
+        }
+
+    def nbytes(self):
+        """Bytes held by the CSR arrays (excludes the key lists, which both representations share)."""
+        return sum(a.nbytes for a in (self.course_ptr, self.course_students,
+                                      self.student_ptr, self.student_courses))
+
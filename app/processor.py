@@ -1,3 +1,5 @@
+import hashlib
+import time
 import pandas as pd
 from app.mapping_utils import generate_course_and_student_mappings
 import xml.etree.ElementTree as ET
@@ -7,16 +9,37 @@ from sqlalchemy.orm import Session
 from db.models import XMLFile
 from db.models import Course, IgnoredCourse,Student, CourseStudent
 from db.session import SessionLocal
+from app.bulk_ingest import BulkIngestor
+
+def iter_xml_elements(xml_file, tag: str):
+    """
+    Stream `tag` elements out of an XML upload with ET.iterparse.
+    Each element is yielded once fully parsed, then detached from its parent and
+    cleared, so peak memory stays flat no matter how large the file is.
+    """
+    stack = []
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if elem.tag != tag:
+            continue
+
+        yield elem
+
+        if stack:
+            stack[-1].remove(elem)
+        elem.clear()
+
 
 def extract_student_course_data(xml_files: List[BytesIO]) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
     student_to_courses = {}
     course_to_students = {}
 
     for file in xml_files:
-        tree = ET.parse(file)
-        root = tree.getroot()
-
-        for g_semester in root.findall(".//G_SEMESTER"):
+        for g_semester in iter_xml_elements(file, "G_SEMESTER"):
             course_code = g_semester.findtext("COURSE_CODE", "").strip().replace(" ", "")
             student_list = g_semester.find("LIST_G_STUDENT_ID")
             if not course_code or student_list is None:
@@ -33,156 +56,200 @@ def extract_student_course_data(xml_files: List[BytesIO]) -> Tuple[Dict[str, Lis
     return student_to_courses, course_to_students
 
 
-def insert_xml_data(xml_file: BytesIO, gender: str, filename: str, db: Session, first_file_id):
-    import xml.etree.ElementTree as ET
-    from db.models import Course, Student, CourseStudent, XMLFile, IgnoredCourse
-
-    existing_mappings = set()
+def load_course_index(db: Session, xml_file_id) -> Dict[str, int]:
+    """
+    course_code -> courses.id for one upload, read in a single query.
+    Duplicated codes resolve to the earliest row, matching the old .first() lookup.
+    """
+    from db.models import Course
+
+    index = {}
+    rows = (
+        db.query(Course.course_code, Course.id)
+        .filter(Course.xml_file_id == xml_file_id)
+        .order_by(Course.id)
+    )
+    for course_code, course_id in rows:
+        index.setdefault(course_code, course_id)
+    return index
+
+
+def hash_upload(xml_file: BytesIO, gender: str, first_file_id=None, ignored_codes=()) -> str:
+    """
+    Content key for an upload: sha256 of its bytes plus the campus type and the
+    ignored-course list the rows were filtered with, so editing that list forces a
+    fresh ingest. Visitor files also fold in the regular upload they are reconciled
+    against, since their course_students rows point at that file's course ids.
+    """
+    digest = hashlib.sha256()
+    xml_file.seek(0)
+    for chunk in iter(lambda: xml_file.read(1 << 20), b""):
+        digest.update(chunk)
+    xml_file.seek(0)
+
+    digest.update(f"|{gender}".encode())
+    digest.update(("|" + ",".join(sorted(ignored_codes))).encode())
+    if gender == "visitor":
+        digest.update(f"|{first_file_id}".encode())
+    return digest.hexdigest()
+
+
+def find_cached_upload(db: Session, content_hash: str, gender: str):
+    """Return the xml_file_id of a fully ingested upload with the same content key, if any."""
+    row = (
+        db.query(XMLFile.id)
+        .filter(XMLFile.content_hash == content_hash, XMLFile.gender_group == gender)
+        .order_by(XMLFile.id)
+        .first()
+    )
+    return row.id if row else None
+
+
+def _start_upload(db: Session, filename: str, gender: str):
+    """
+    Insert the xml_files row, flushed for its id but left in the open transaction, so
+    a failed upload rolls back whole instead of leaving an empty xml_files row behind.
+    """
+    from db.models import XMLFile
 
-    # ✅ Step 1: Insert XML file record
     xml_record = XMLFile(filename=filename, gender_group=gender)
     db.add(xml_record)
-    db.commit()
-    db.refresh(xml_record)
-    xml_file_id = xml_record.id
+    db.flush()
+    return xml_record
+
 
-    # ✅ Step 2: Parse XML
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
+def _load_ignored_codes(db: Session):
+    from db.models import IgnoredCourse
 
-    # ✅ Step 3: Load ignored course codes
     ignored_rows = db.query(IgnoredCourse).all()
-    ignored_codes = {r.course_code.strip().replace(" ", "") for r in ignored_rows}
+    return {r.course_code.strip().replace(" ", "") for r in ignored_rows}
 
-    # ✅ Step 4: Prepare mappings
-    unique_courses = {}
-    student_id_map = {}
 
-    # ✅ Male Campus Parsing
-    if gender == "regular":
-        for g_semester in root.findall(".//G_SEMESTER"):
-            course_code = g_semester.findtext("COURSE_CODE", "").strip().replace(" ", "")
+def _parse_regular(xml_file, ingestor: BulkIngestor, ignored_codes):
+    for g_semester in iter_xml_elements(xml_file, "G_SEMESTER"):
+        course_code = g_semester.findtext("COURSE_CODE", "").strip().replace(" ", "")
+        if not course_code or course_code in ignored_codes:
+            continue
+
+        course_name = g_semester.findtext("COURSE_NAME", "").strip()
+        section = g_semester.findtext("SECTION", "").strip()
+        ingestor.add_course(course_code, course_name, section)
+
+        student_list = g_semester.find("LIST_G_STUDENT_ID")
+        if student_list is not None:
+            for g_student in student_list.findall("G_STUDENT_ID"):
+                student_id = g_student.findtext("STUDENT_ID1", "").strip()
+                name = g_student.findtext("STUDENT_NAME_S", "").strip()
+                major = g_student.findtext("MAJOR_DESC", "").strip()
+
+                if not student_id:
+                    continue
+
+                ingestor.add_student(student_id, name, major)
+                ingestor.add_link(course_code, student_id)
+
+
+def _parse_visitor(xml_file, ingestor: BulkIngestor, ignored_codes, regular_index):
+    """regular_index: course_code -> id of the regular upload (load_course_index)."""
+    for record in iter_xml_elements(xml_file, "ACADEMIC_RECORDS"):
+        student_id = record.findtext("STUDENT_ID", "").strip()
+        student_name = record.findtext("STUDENT_NAME", "").strip()
+        major = record.findtext("MAJOR_NAME", "").strip()
+
+        if not student_id:
+            continue
+
+        ingestor.add_student(student_id, student_name, major)
+
+        for g_course in record.findall(".//G_STUDENT_ID1"):
+            course_code = g_course.findtext("COURSE_CODE", "").strip().replace(" ", "")
+            if "(" in course_code:
+                course_code = course_code.split("(")[0].strip()
             if not course_code or course_code in ignored_codes:
                 continue
 
-            if course_code not in unique_courses:
-                course_name = g_semester.findtext("COURSE_NAME", "").strip()
-                section = g_semester.findtext("SECTION", "").strip()
-
-                course = Course(
-                    course_code=course_code,
-                    course_name=course_name,
-                    section=section,
-                    xml_file_id=xml_file_id
-                )
-                db.add(course)
-                db.flush()
-                unique_courses[course_code] = course.id
-
-            course_id = unique_courses[course_code]
-            student_list = g_semester.find("LIST_G_STUDENT_ID")
-            if student_list is not None:
-                for g_student in student_list.findall("G_STUDENT_ID"):
-                    student_id = g_student.findtext("STUDENT_ID1", "").strip()
-                    name = g_student.findtext("STUDENT_NAME_S", "").strip()
-                    major = g_student.findtext("MAJOR_DESC", "").strip()
-
-                    if not student_id:
-                        continue
-
-                    if student_id not in student_id_map:
-                        student = Student(
-                            student_id1=student_id,
-                            name=name,
-                            major=major,
-                            xml_file_id=xml_file_id
-                        )
-                        db.add(student)
-                        db.flush()
-                        student_id_map[student_id] = student.id
-
-                    if (course_id, student_id_map[student_id]) not in existing_mappings:
-                        mapping = CourseStudent(
-                            course_id=course_id,
-                            student_id=student_id_map[student_id]
-                        )
-                        db.add(mapping)
-                        existing_mappings.add((course_id, student_id_map[student_id]))
-
-    # ✅ Female Campus Parsing
-    elif gender == "visitor":
-        for record in root.findall(".//ACADEMIC_RECORDS"):
-            student_id = record.findtext("STUDENT_ID", "").strip()
-            student_name = record.findtext("STUDENT_NAME", "").strip()
-            major = record.findtext("MAJOR_NAME", "").strip()
+            if not ingestor.has_course(course_code):
+                if course_code in regular_index:
+                    ingestor.register_course(course_code, regular_index[course_code])
+                else:
+                    course_name = g_course.findtext("COURSE_NAME", "").strip()
+                    section = g_course.findtext("SECTION", "").strip()
+                    ingestor.add_course(course_code, course_name, section)
 
-            if not student_id:
-                continue
+            ingestor.add_link(course_code, student_id)
 
-            if student_id not in student_id_map:
-                student = Student(
-                    student_id1=student_id,
-                    name=student_name,
-                    major=major,
-                    xml_file_id=xml_file_id
-                )
-                db.add(student)
-                db.flush()
-                student_id_map[student_id] = student.id
-
-            for g_course in record.findall(".//G_STUDENT_ID1"):
-                course_code = g_course.findtext("COURSE_CODE", "").strip().replace(" ", "")
-                if "(" in course_code:
-                    course_code = course_code.split("(")[0].strip()
-                if not course_code or course_code in ignored_codes:
-                    continue
 
-                course_name = g_course.findtext("COURSE_NAME", "").strip()
-                section = g_course.findtext("SECTION", "").strip()
-
-                if course_code not in unique_courses:
-                    existing = db.query(Course).filter(
-                        Course.course_code == course_code,
-                        Course.xml_file_id.in_([xml_file_id, first_file_id])
-                    ).first()
-
-                    if existing:
-                        unique_courses[course_code] = existing.id
-                    else:
-                        course = Course(
-                            course_code=course_code,
-                            course_name=course_name,
-                            section=section,
-                            xml_file_id=xml_file_id
-                        )
-                        db.add(course)
-                        db.flush()
-                        unique_courses[course_code] = course.id
-
-                course_id = unique_courses[course_code]
-                if (course_id, student_id_map[student_id]) not in existing_mappings:
-                    mapping = CourseStudent(
-                        course_id=course_id,
-                        student_id=student_id_map[student_id]
-                    )
-                    db.add(mapping)
-                    existing_mappings.add((course_id, student_id_map[student_id]))
+def _finish_upload(db: Session, xml_record, ingestor: BulkIngestor, content_hash):
+    # The content hash is only recorded once every row is in
+    ingestor.flush()
+    xml_record.content_hash = content_hash
+    db.commit()
+
+    print(f"\n✅ Finished inserting XML ID {ingestor.xml_file_id}")
+    print(f"   Total courses: {len(ingestor.course_ids)}  (inserted {ingestor.courses_written})")
+    print(f"   Total students: {ingestor.students_written}")
+    print(f"   Total mappings: {ingestor.links_written}")
+    print(f"   Throughput: {ingestor.rows_per_second():,.0f} rows/s  ({ingestor.rows_written} rows)")
+
+
+def insert_xml_data(xml_file: BytesIO, gender: str, filename: str, db: Session, first_file_id,
+                    batch_size: int = 5000, content_hash: str = None):
+    """
+    Stream one XML upload into the database.
+    Elements are parsed incrementally and discarded once handled; parsed rows are
+    collected by a BulkIngestor and written in multi-row batches of `batch_size`
+    enrollments, so the first rows reach the database before parsing finishes.
+    """
+    # ✅ Step 1: Insert XML file record
+    xml_record = _start_upload(db, filename, gender)
+
+    # ✅ Step 2: Load ignored course codes
+    ignored_codes = _load_ignored_codes(db)
+
+    # ✅ Step 3: Prepare bulk writer
+    ingestor = BulkIngestor(db, xml_record.id, batch_size=batch_size)
+
+    # ✅ Male Campus Parsing (streamed)
+    if gender == "regular":
+        _parse_regular(xml_file, ingestor, ignored_codes)
+
+    # ✅ Female Campus Parsing (streamed)
+    elif gender == "visitor":
+        # Regular-campus codes are reconciled in memory against one preloaded index
+        regular_index = load_course_index(db, first_file_id)
+        _parse_visitor(xml_file, ingestor, ignored_codes, regular_index)
 
     # ✅ Final Commit
-    db.commit()
+    _finish_upload(db, xml_record, ingestor, content_hash)
 
-    print(f"\n✅ Finished inserting XML ID {xml_file_id}")
-    print(f"   Total courses: {len(unique_courses)}")
-    print(f"   Total students: {len(student_id_map)}")
-    print(f"   Total mappings: {db.query(CourseStudent).filter(CourseStudent.course_id.in_(unique_courses.values())).count()}")
+    return xml_record.id
 
-    return xml_file_id, root
 
 def process_uploaded_file(file, gender, first_file_id):
     if file is None:
         return None
 
     db = SessionLocal()
-    xml_id, _ = insert_xml_data(file, gender=gender, filename=file.name, db=db,first_file_id=first_file_id)
-    db.close()
-    return xml_id
+    try:
+        content_hash = hash_upload(file, gender, first_file_id, _load_ignored_codes(db))
+        cached_id = find_cached_upload(db, content_hash, gender)
+        if cached_id is not None:
+            print(f"♻️ {file.name} already ingested as XML ID {cached_id}; reusing it")
+            return cached_id
+
+        return insert_xml_data(file, gender=gender, filename=file.name, db=db,
+                               first_file_id=first_file_id, content_hash=content_hash)
+    finally:
+        db.close()
+
+
+def ingest_upload_pair(regular_file, visitor_file):
+    """
+    Ingest the regular upload, then the visitor upload reconciled against it.
+    Returns (regular_xml_id, visitor_xml_id).
+    """
+    t0 = time.perf_counter()
+    regular_id = process_uploaded_file(regular_file, gender="regular", first_file_id=None)
+    visitor_id = process_uploaded_file(visitor_file, gender="visitor", first_file_id=regular_id)
+    print(f"⏱️ Pair ingested in {time.perf_counter() - t0:.2f}s")
+    return regular_id, visitor_id
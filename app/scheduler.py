@@ -1,11 +1,30 @@
 from db.session import SessionLocal
-from db.models import Course, Student, CourseStudent
+from db.models import Course, Student, CourseStudent, XMLFile
 from collections import defaultdict, Counter
+from array import array
+import numpy as np
 import pandas as pd
 from datetime import timedelta, date
 import time
+import hashlib
 from sqlalchemy import text  # for lightweight bulk inserts
 import random  # 🔹 for seeded restarts/tie-breaks
+import heapq
+import os
+import atexit
+import ctypes
+import itertools
+import mmap
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from app.enrollment import CSRMapping, Enrollment
+from app.conflict_graph import build_conflict_graph
+from app.clique_bound import clique_lower_bound
+from app.snapshot_cache import EnrollmentSnapshot, load_snapshot, save_snapshot
 
 # ✅ Static fixed slots for specified courses (slot = even index; 0=Day1 AM, 2=Day2 AM, ..., 18=Day10 AM)
 FIXED_COURSE_SLOTS = {
@@ -13,6 +32,12 @@ FIXED_COURSE_SLOTS = {
     # "IC.408": 8
 }
 
+# DSATUR restart portfolio: number of (slot order, seed) restarts and worker processes (0 = all cores)
+SCHEDULER_RESTARTS = int(os.getenv("SCHEDULER_RESTARTS", "25"))
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "0"))
+# Wall-clock budget (seconds) for one schedule_exams_from_db run, load to save
+SCHEDULER_TIME_BUDGET = float(os.getenv("SCHEDULER_TIME_BUDGET", "180"))
+
 # -------------------------
 # Instrumentation helpers
 # -------------------------
@@ -22,6 +47,17 @@ def _now_ms():
 def _fmt_ms(ms):
     return f"{ms/1000:.2f}s"
 
+def _logger(verbose):
+    """print, or a no-op for solver calls whose chatter the caller does not want."""
+    return print if verbose else (lambda *args, **kwargs: None)
+
+def _available_cores():
+    """Cores this process may run on (the affinity mask where the OS has one)."""
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
 
 def get_day_and_time(slot, start_date):
     """
@@ -32,94 +68,138 @@ def get_day_and_time(slot, start_date):
     return exam_date.strftime("%Y-%m-%d"), ("AM" if (slot % 2 == 0) else "PM")
 
 
-def get_student_course_mappings(xml_file_ids):
+def load_enrollment(xml_file_ids, batch_size=10000):
+    """
+    Enrollment for the selected uploads only, interned straight into an Enrollment.
+    course_students is joined to courses/students and filtered by xml_file_ids on the
+    server; only id/code columns (plus the student name) are selected and rows are
+    streamed through a server-side cursor in batches of `batch_size`.
+    Returns enrollment (course keys = (code, name), student keys = student_id1),
+    course_map, student_names.
+    """
     t0 = _now_ms()
-    print("📥 [get_student_course_mappings] start", flush=True)
+    print("📥 [load_enrollment] start", flush=True)
     db = SessionLocal()
 
-    courses = db.query(Course).filter(Course.xml_file_id.in_(xml_file_ids)).all()
-    students = db.query(Student).filter(Student.xml_file_id.in_(xml_file_ids)).all()
-    print(f"  • Courses fetched: {len(courses)}  • Students fetched: {len(students)}", flush=True)
-
-    course_map = {c.id: (c.course_code, c.course_name) for c in courses}
-    student_map = {s.id: s.student_id1 for s in students}
-
-    course_to_students = defaultdict(set)
-    student_to_courses = defaultdict(set)
-
-    # NOTE: full scan — consider filtering via join in future for speed
-    mappings = db.query(CourseStudent).all()
-    print(f"  • CourseStudent mappings fetched (unfiltered): {len(mappings)}", flush=True)
-
-    miss_course, miss_student = 0, 0
-    for m in mappings:
-        if m.course_id not in course_map:
-            miss_course += 1
-            continue
-        if m.student_id not in student_map:
-            miss_student += 1
-            continue
-        course_code = course_map[m.course_id]
-        student_id = student_map[m.student_id]
-        course_to_students[course_code].add(student_id)
-        student_to_courses[student_id].add(course_code)
+    course_rows = (
+        db.query(Course.id, Course.course_code, Course.course_name)
+        .filter(Course.xml_file_id.in_(xml_file_ids))
+        .all()
+    )
+    course_map = {cid: (code, name) for cid, code, name in course_rows}
+    print(f"  • Courses fetched: {len(course_map)}", flush=True)
+
+    # Rows sharing a (code, name) key collapse onto one dense course id
+    course_index = {}
+    pk_to_course = {cid: course_index.setdefault(key, len(course_index)) for cid, key in course_map.items()}
+    student_index = {}
+    student_names = {}
+    pair_courses = array("i")
+    pair_students = array("i")
+
+    enrollment = (
+        db.query(CourseStudent.course_id, Student.student_id1, Student.name)
+        .join(Course, CourseStudent.course_id == Course.id)
+        .join(Student, CourseStudent.student_id == Student.id)
+        .filter(Course.xml_file_id.in_(xml_file_ids), Student.xml_file_id.in_(xml_file_ids))
+        .yield_per(batch_size)
+    )
 
-    if miss_course or miss_student:
-        print(f"  • Skipped mappings   missing_course={miss_course} missing_student={miss_student}", flush=True)
+    for course_id, student_id, student_name in enrollment:
+        s = student_index.get(student_id)
+        if s is None:
+            s = student_index[student_id] = len(student_index)
+        pair_courses.append(pk_to_course[course_id])
+        pair_students.append(s)
+        student_names[student_id] = student_name
 
     db.close()
-    print("📤 [get_student_course_mappings] done in", _fmt_ms(_now_ms() - t0), flush=True)
-    return course_to_students, student_to_courses, course_map
+    print(f"  • CourseStudent mappings streamed (filtered): {len(pair_courses)}  • Students: {len(student_index)}", flush=True)
+
+    enrollment = Enrollment.from_pairs(list(course_index), list(student_index), pair_courses, pair_students)
+    print("📤 [load_enrollment] done in", _fmt_ms(_now_ms() - t0), flush=True)
+    return enrollment, course_map, student_names
 
 
-def apply_merged_course_mapping(course_to_students, student_to_courses):
-    print("🔗 [apply_merged_course_mapping] start", flush=True)
+def load_merged_groups():
     from db.models import MergedCourse
     db = SessionLocal()
-    merged_groups = db.query(MergedCourse).all()
+    merged_groups = db.query(MergedCourse.group_id, MergedCourse.course_code).all()
     db.close()
     print(f"  • Merged groups rows: {len(merged_groups)}", flush=True)
 
     group_map = defaultdict(set)
     course_to_group = {}
+    for group_id, course_code in merged_groups:
+        group_map[group_id].add(course_code)
+        course_to_group[course_code] = group_id
+    return group_map, course_to_group
+
+
+def merge_enrollment(enrollment, course_to_group):
+    """Enrollment over merged course keys (group id, or the bare code for ungrouped courses)."""
+    print("🔗 [merge_enrollment] start", flush=True)
+    merged = enrollment.map_courses(lambda course: course_to_group.get(course[0], course[0]))
+    print(f"✅ [merge_enrollment] done  • merged_courses={merged.num_courses}", flush=True)
+    return merged
+
+
+def enrollment_fingerprint(xml_file_ids, group_map):
+    """
+    Cheap digest of everything a snapshot is derived from: the selected xml_files rows
+    (id, content_hash, uploaded_at) and the merged_courses groups. One indexed lookup
+    per upload, independent of enrollment size. Each upload's rows are written in the
+    same transaction as its xml_files row and never touched afterwards, so re-ingesting,
+    deleting or replacing an upload, or regrouping courses, changes the digest. Rows
+    edited or deleted by hand are not seen: after that, run with use_snapshot=False (or
+    clear ENROLLMENT_SNAPSHOT_DIR) once.
+    """
+    db = SessionLocal()
+    try:
+        files = (
+            db.query(XMLFile.id, XMLFile.content_hash, XMLFile.uploaded_at)
+            .filter(XMLFile.id.in_(xml_file_ids))
+            .order_by(XMLFile.id)
+            .all()
+        )
+    finally:
+        db.close()
 
-    for item in merged_groups:
-        group_map[item.group_id].add(item.course_code)
-        course_to_group[item.course_code] = item.group_id
-
-    merged_course_to_students = defaultdict(set)
-    for course, students in course_to_students.items():
-        course_code = course[0]
-        group_id = course_to_group.get(course_code, course_code)
-        merged_course_to_students[group_id].update(students)
-
-    merged_student_to_courses = defaultdict(set)
-    for student, courses in student_to_courses.items():
-        for course in courses:
-            course_code = course[0]
-            group_id = course_to_group.get(course_code, course_code)
-            merged_student_to_courses[student].add(group_id)
-
-    print("✅ [apply_merged_course_mapping] done", flush=True)
-    return merged_course_to_students, merged_student_to_courses, group_map, course_to_group
-
-
-def build_conflict_map(student_to_courses):
-    print("🧮 [build_conflict_map] start", flush=True)
-    conflict_map = defaultdict(set)
-    for courses in student_to_courses.values():
-        courses = list(courses)
-        for i in range(len(courses)):
-            for j in range(i + 1, len(courses)):
-                c1 = courses[i]
-                c2 = courses[j]
-                conflict_map[c1].add(c2)
-                conflict_map[c2].add(c1)
-    edges = sum(len(v) for v in conflict_map.values())
-    print(f"  • Conflict edges (directed count): {edges}", flush=True)
-    print(f"  • Nodes in conflict_map: {len(conflict_map)}", flush=True)
-    print("✅ [build_conflict_map] done", flush=True)
-    return conflict_map
+    groups = sorted((gid, sorted(codes)) for gid, codes in group_map.items())
+    payload = repr(([tuple(r) for r in files], groups))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def prepare_enrollment(xml_file_ids, use_snapshot=True):
+    """
+    Raw + merged enrollment and the weighted merged conflict graph for xml_file_ids.
+    Served from the on-disk snapshot when its fingerprint still matches; otherwise
+    loaded from PostgreSQL and written back as a new snapshot.
+    Returns snapshot, group_map, course_to_group.
+    """
+    t0 = _now_ms()
+    group_map, course_to_group = load_merged_groups()
+
+    fingerprint = None
+    if use_snapshot:
+        fingerprint = enrollment_fingerprint(xml_file_ids, group_map)
+        snapshot = load_snapshot(xml_file_ids, fingerprint)
+        if snapshot is not None:
+            print(f"⚡ [snapshot] hit in {_fmt_ms(_now_ms() - t0)}", flush=True)
+            return snapshot, group_map, course_to_group
+
+    raw_enrollment, course_map, student_names = load_enrollment(xml_file_ids)
+    enrollment = merge_enrollment(raw_enrollment, course_to_group)
+    conflict_graph = build_conflict_graph(enrollment)
+    print(f"  • Conflict graph: nodes={conflict_graph.num_courses} edges={conflict_graph.num_edges}", flush=True)
+    snapshot = EnrollmentSnapshot(raw_enrollment, course_map, student_names, enrollment, conflict_graph)
+
+    if use_snapshot:
+        try:
+            save_snapshot(xml_file_ids, fingerprint, snapshot)
+        except OSError as e:
+            print(f"⚠️ [snapshot] could not be saved: {e}", flush=True)
+    return snapshot, group_map, course_to_group
 
 
 # -------------------------
@@ -136,163 +216,450 @@ def _build_slot_day_maps(day_slots):
     day_to_slot = {d: s for d, s in enumerate(day_slots)}
     return slot_to_day, day_to_slot
 
-def _triples_from_slots_order_aware(slots_set, slot_to_day, num_days):
+def _has_triple(day_mask):
+    """True if the day bitmask has three consecutive days set."""
+    return bool(day_mask & (day_mask >> 1) & (day_mask >> 2))
+
+
+class DayOccupancy:
     """
-    Convert a set of slots -> day indices using slot_to_day, then return all (d,d+1,d+2) windows present.
+    Per-student exam days as bitmasks in one day order (bit d set <=> the student sits
+    an exam on day index d of day_slots). Triple checks are a few shifts and ANDs, and
+    moves update the masks in place. Slots outside day_slots are ignored.
     """
-    day_idxs = sorted({slot_to_day[s] for s in slots_set if s in slot_to_day})
-    dayset = set(day_idxs)
-    triples = []
-    for d in range(num_days - 2):
-        if d in dayset and (d+1) in dayset and (d+2) in dayset:
-            triples.append((d, d+1, d+2))
-    return triples
-
-def _triple_would_be_created_order_aware(current_slots_set, candidate_slot, slot_to_day, num_days, old_slot=None):
-    sset = set(current_slots_set)
-    if old_slot is not None and old_slot in sset:
-        sset.remove(old_slot)
-    sset.add(candidate_slot)
-    return len(_triples_from_slots_order_aware(sset, slot_to_day, num_days)) > 0
+
+    def __init__(self, day_slots):
+        self.slot_to_day = {s: d for d, s in enumerate(day_slots)}
+        self.masks = defaultdict(int)
+
+    @classmethod
+    def from_assignment(cls, day_slots, course_slot_map, course_to_students):
+        occupancy = cls(day_slots)
+        for c, sl in course_slot_map.items():
+            occupancy.add(course_to_students.get(c, ()), sl)
+        return occupancy
+
+    def _bit(self, slot):
+        d = self.slot_to_day.get(slot)
+        return 0 if d is None else 1 << d
+
+    def add(self, students, slot):
+        bit = self._bit(slot)
+        if bit:
+            for stu in students:
+                self.masks[stu] |= bit
+
+    def remove(self, students, slot):
+        bit = self._bit(slot)
+        if bit:
+            for stu in students:
+                self.masks[stu] &= ~bit
+
+    def move(self, students, old_slot, new_slot):
+        self.remove(students, old_slot)
+        self.add(students, new_slot)
+
+    def add_counting(self, students, slot):
+        """add() that returns how many (student, window) triples the new day creates."""
+        bit = self._bit(slot)
+        created = 0
+        if bit:
+            for stu in students:
+                m = self.masks[stu]
+                if not m & bit:
+                    new = m | bit
+                    created += (new & (new >> 1) & (new >> 2)).bit_count() - (m & (m >> 1) & (m >> 2)).bit_count()
+                    self.masks[stu] = new
+        return created
+
+    def has_triple(self, stu):
+        return _has_triple(self.masks.get(stu, 0))
+
+    def triple_count(self):
+        """Number of (student, 3-day window) violations."""
+        return sum((m & (m >> 1) & (m >> 2)).bit_count() for m in self.masks.values())
+
+    def would_create_triple(self, stu, slot, old_slot=None):
+        """Would the student have three consecutive exam days after moving old_slot -> slot?"""
+        mask = self.masks.get(stu, 0)
+        if old_slot is not None:
+            mask &= ~self._bit(old_slot)
+        return _has_triple(mask | self._bit(slot))
+
+
+def _window_hits(windows, day):
+    """How many triple windows (bit d = days d..d+2) contain `day`."""
+    if day >= 2:
+        return ((windows >> (day - 2)) & 7).bit_count()
+    return (windows & ((1 << (day + 1)) - 1)).bit_count()
+
+
+class ScheduleState(DayOccupancy):
+    """
+    The repair engines' mutable view of a live course -> slot assignment. On top of the
+    per-student day masks it keeps, all updated incrementally by move_courses():
+      day_slots / slot_to_day / day_to_slot: the active day order
+      slot_load[slot]: courses on the slot; slot_courses[slot]: those courses (ordered)
+      windows[student]: triple windows, bit d set <=> days d, d+1, d+2 all taken
+      course_weight[course]: the (student, window) triples the course is part of
+    A move re-counts only the students of the moved courses.
+
+    The day masks have no multiplicity: a bit records that a student sits some exam
+    that day, not how many. Moves must therefore keep the assignment conflict-free;
+    a move that puts two of a student's courses on one day, and a later move of
+    either one, leaves the masks, windows and course_weight wrong.
+    """
+
+    def __init__(self, day_slots, course_slot_map, course_to_students, student_to_courses):
+        super().__init__(day_slots)
+        self.day_slots = list(day_slots)
+        self.day_to_slot = dict(enumerate(self.day_slots))
+        self.assignment = course_slot_map
+        self.course_to_students = course_to_students
+        self.student_to_courses = student_to_courses
+        self.slot_load = Counter()
+        self.slot_courses = defaultdict(dict)  # dict as an insertion-ordered set
+        self.windows = {}  # only students currently in a triple
+        self.course_weight = defaultdict(int)
+        self._rank = {stu: i for i, stu in enumerate(student_to_courses)}
+        for c, sl in course_slot_map.items():
+            self.add(course_to_students.get(c, ()), sl)
+            self.slot_load[sl] += 1
+            self.slot_courses[sl][c] = None
+        for stu in list(self.masks):
+            self._count(stu)
+
+    def _courses_with_days(self, stu):
+        for c in self.student_to_courses.get(stu, ()):
+            d = self.slot_to_day.get(self.assignment.get(c))
+            if d is not None:
+                yield c, d
+
+    def _count(self, stu):
+        m = self.masks.get(stu, 0)
+        w = m & (m >> 1) & (m >> 2)
+        if w:
+            self.windows[stu] = w
+            for c, d in self._courses_with_days(stu):
+                self.course_weight[c] += _window_hits(w, d)
+
+    def _uncount(self, stu):
+        w = self.windows.pop(stu, 0)
+        if w:
+            for c, d in self._courses_with_days(stu):
+                self.course_weight[c] -= _window_hits(w, d)
+
+    def move_courses(self, moves):
+        """Apply {course: new_slot} to the assignment and every index."""
+        touched = set()
+        for c in moves:
+            touched.update(self.course_to_students.get(c, ()))
+        for stu in touched:
+            self._uncount(stu)
+        for c in moves:
+            old = self.assignment[c]
+            self.remove(self.course_to_students.get(c, ()), old)
+            self.slot_load[old] -= 1
+            del self.slot_courses[old][c]
+        for c, sl in moves.items():
+            self.add(self.course_to_students.get(c, ()), sl)
+            self.assignment[c] = sl
+            self.slot_load[sl] += 1
+            self.slot_courses[sl][c] = None
+        for stu in touched:
+            self._count(stu)
+
+    def triple_count(self):
+        return sum(w.bit_count() for w in self.windows.values())
+
+    def moves_delta(self, moves):
+        """Change in triple_count() if {course: new_slot} were applied; O(students of the moved courses)."""
+        cleared, placed = defaultdict(int), defaultdict(int)
+        for c, sl in moves.items():
+            old_bit, new_bit = self._bit(self.assignment[c]), self._bit(sl)
+            for stu in self.course_to_students.get(c, ()):
+                cleared[stu] |= old_bit
+                placed[stu] |= new_bit
+        delta = 0
+        for stu, clr in cleared.items():
+            m = self.masks.get(stu, 0)
+            n = (m & ~clr) | placed[stu]
+            delta += (n & (n >> 1) & (n >> 2)).bit_count() - (m & (m >> 1) & (m >> 2)).bit_count()
+        return delta
+
+    def violations(self):
+        """[(student, (d, d+1, d+2))] in student order."""
+        out = []
+        for stu in sorted(self.windows, key=self._rank.get):
+            out.extend((stu, (d, d + 1, d + 2)) for d in _iter_bits(self.windows[stu]))
+        return out
+
+    def courses_on(self, stu, slot):
+        return [c for c in self.student_to_courses.get(stu, ()) if self.assignment.get(c) == slot]
 
 
 # -------------------------
 # Fast pass: DSATUR greedy (with order-aware triple tie-break)
 # -------------------------
+def _iter_bits(mask):
+    """Indices of the set bits of an int, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
 def _dsatur_color(course_list, conflict_map, max_colors, preferred_slots, fixed_slot_assignment,
-                  course_to_students, seed=0):
+                  course_to_students, seed=0, weighted_degrees=None, upper_bound=None, report=None,
+                  verbose=True):
     """
     DSATUR greedy confined to 'preferred_slots' (AM-only).
     Tie-break prefers slots that do NOT create 3-in-3 (order-aware by day index).
+    weighted_degrees: optional per-course shared-student totals (ConflictGraph); among
+    equally saturated courses of equal degree, the more heavily co-enrolled goes first.
+
+    Each uncolored course keeps its forbidden slots as a bitmask over positions in
+    preferred_slots, so saturation is a popcount and free slots are ~forbidden.
+    The next course comes off a max-heap keyed (saturation, degree, wdeg, rand); a
+    course whose saturation rises is pushed again and its older entries are skipped
+    as stale when popped (lazy invalidation), so a coloring is O(E log V).
+
+    Branch and bound: the triple count is kept as courses are placed, and the coloring
+    is abandoned (returns None) once it exceeds upper_bound. upper_bound is an int or a
+    shared multiprocessing Value re-read on every step (negative = no bound).
+    report: optional dict, filled with stop ('complete' | 'no_free_slot' | 'bound'),
+    triples and colored (courses placed by this call).
+    verbose=False silences the progress lines.
     """
-    print("⚡ [dsatur] start (AM-only, even slot IDs)  • seed=", seed, flush=True)
+    log = _logger(verbose)
+    log("⚡ [dsatur] start (AM-only, even slot IDs)  • seed=", seed, flush=True)
     rnd = random.Random(seed)
     assignment = dict(fixed_slot_assignment)
 
-    neighbors = {c: set(conflict_map.get(c, set())) for c in course_list}
-    degrees = {c: len(neighbors[c]) for c in course_list}
-
-    # Build day maps for THIS order
+    # Day occupancy in THIS order
     day_slots = preferred_slots[:max_colors]
-    slot_to_day, _ = _build_slot_day_maps(day_slots)
-    num_days = len(day_slots)
+    occupancy = DayOccupancy(day_slots)
 
-    # Dynamic per-student slots (from fixed)
-    student_slots_dyn = defaultdict(set)
+    cap = min(max_colors, len(preferred_slots))
+    slot_pos = {preferred_slots[k]: k for k in range(cap)}
+    all_slots_mask = (1 << cap) - 1
+
+    # Dynamic per-student days (from fixed)
     for c_fixed, sl in fixed_slot_assignment.items():
-        if sl in slot_to_day:
-            for stu in course_to_students.get(c_fixed, set()):
-                student_slots_dyn[stu].add(sl)
+        occupancy.add(course_to_students.get(c_fixed, ()), sl)
+    triples = occupancy.triple_count()
 
-    uncolored = [c for c in course_list if c not in assignment]
-    rand_rank = {c: rnd.random() for c in uncolored}
+    def bound():
+        return upper_bound.value if hasattr(upper_bound, "value") else upper_bound
 
-    sat_deg = {c: 0 for c in uncolored}
-    neighbor_slots = {c: set() for c in uncolored}
+    def stop(reason):
+        if report is not None:
+            report.update(stop=reason, triples=triples, colored=len(assignment) - len(fixed_slot_assignment))
 
-    for c in uncolored:
-        seen = set()
-        for n in neighbors[c]:
-            if n in assignment:
-                seen.add(assignment[n])
-        neighbor_slots[c] = seen
-        sat_deg[c] = len(seen)
+    uncolored = [c for c in course_list if c not in assignment]
+    rand_rank = {c: rnd.random() for c in uncolored}
+    wdeg = {c: (int(weighted_degrees[c]) if weighted_degrees is not None else 0) for c in uncolored}
+    degrees = {c: len(conflict_map.get(c, ())) for c in uncolored}
 
-    cap = min(max_colors, len(preferred_slots))
+    forbidden = {c: 0 for c in uncolored}
+    for c_fixed, sl in fixed_slot_assignment.items():
+        if sl in slot_pos:
+            for n in conflict_map.get(c_fixed, ()):
+                if n in forbidden:
+                    forbidden[n] |= 1 << slot_pos[sl]
 
-    def pick_next():
-        return max(uncolored, key=lambda x: (sat_deg[x], degrees[x], rand_rank[x]))
+    def push(c):
+        heapq.heappush(heap, (-forbidden[c].bit_count(), -degrees[c], -wdeg[c], -rand_rank[c], c))
 
-    while uncolored:
-        v = pick_next()
-        forbidden = neighbor_slots[v]
+    heap = []
+    for c in uncolored:
+        push(c)
 
-        candidates = [preferred_slots[k] for k in range(cap) if preferred_slots[k] not in forbidden]
+    while heap:
+        neg_sat, _, _, _, v = heapq.heappop(heap)
+        if v not in forbidden or -neg_sat != forbidden[v].bit_count():
+            continue  # already colored, or superseded by a higher-saturation entry
+        free = all_slots_mask & ~forbidden[v]
 
-        if not candidates:
-            print("⚡ [dsatur] needs more than", cap, "AM slots. fallback required.", flush=True)
+        if not free:
+            log("⚡ [dsatur] needs more than", cap, "AM slots. fallback required.", flush=True)
+            stop("no_free_slot")
             return None
 
         enrolled = course_to_students.get(v, set())
 
-        def triple_penalty(slot):
-            # penalty 1 if any enrolled student forms a triple under order-aware check
-            for stu in enrolled:
-                if _triple_would_be_created_order_aware(student_slots_dyn.get(stu, set()), slot, slot_to_day, num_days):
-                    return 1
-            return 0
-
-        candidates_ranked = sorted(candidates, key=lambda s: (triple_penalty(s), preferred_slots.index(s)))
+        def creates_triple(slot):
+            # True if any enrolled student forms a triple under order-aware check
+            return any(occupancy.would_create_triple(stu, slot) for stu in enrolled)
 
-        chosen_slot = candidates_ranked[0]
+        # First free slot (in preferred order) that creates no triple, else the first free slot
+        free_positions = list(_iter_bits(free))
+        chosen_pos = next((k for k in free_positions if not creates_triple(preferred_slots[k])), free_positions[0])
+        chosen_slot = preferred_slots[chosen_pos]
         assignment[v] = chosen_slot
-        uncolored.remove(v)
-
-        for n in neighbors[v]:
-            if n in neighbor_slots and chosen_slot not in neighbor_slots[n]:
-                neighbor_slots[n].add(chosen_slot)
-                sat_deg[n] = len(neighbor_slots[n])
-
-        for stu in enrolled:
-            student_slots_dyn[stu].add(chosen_slot)
+        del forbidden[v]
+
+        bit = 1 << chosen_pos
+        for n in conflict_map.get(v, ()):
+            if n in forbidden and not forbidden[n] & bit:
+                forbidden[n] |= bit
+                push(n)
+
+        triples += occupancy.add_counting(enrolled, chosen_slot)
+        limit = bound()
+        if limit is not None and 0 <= limit < triples:
+            log(f"✂️ [dsatur] pruned: triples={triples} > bound={limit}", flush=True)
+            stop("bound")
+            return None
 
-    print("✅ [dsatur] success within available AM (even) slots", flush=True)
+    log("✅ [dsatur] success within available AM (even) slots", flush=True)
+    stop("complete")
     return assignment
 
 
 # ------------------------------------
-# Capped backtracking (AM-only, even)
+# Exact colorer (AM-only, even): iterative FC-CBJ
 # ------------------------------------
 def backtrack_schedule(course_list, conflict_map, slot_list, fixed_slot_assignment,
-                       max_ms_per_attempt=10000, max_calls_per_attempt=2_000_000):
-    print(f"🧠 [backtrack_schedule] Start: courses={len(course_list)} slots={len(slot_list)} fixed={len(fixed_slot_assignment)} (AM-only even)", flush=True)
+                       max_ms_per_attempt=10000, max_calls_per_attempt=2_000_000, report=None,
+                       should_stop=None, verbose=True):
+    """
+    Exact coloring of course_list into slot_list around the fixed assignment.
+
+    Iterative search (explicit stack, no recursion limit) with:
+      - domains as bitmasks over positions in slot_list, values tried in slot_list order
+      - dynamic variable choice: smallest remaining domain, then highest degree
+        (lazily invalidated heap, like DSATUR)
+      - forward checking: placing a course strikes its slot from every free neighbor,
+        and a wiped-out domain rejects the value immediately
+      - conflict-directed backjumping: on a dead end, jump straight to the deepest
+        course that pruned it instead of the previous one
+    Returns the full assignment, or None when the day count is proven infeasible or a
+    cap (time / calls) is hit. report: optional dict, filled with stop
+    ('complete' | 'infeasible' | 'time' | 'calls' | 'stopped') and calls.
+    should_stop: optional callable polled with the time cap; True abandons the search.
+    verbose=False silences the progress lines.
+    """
+    log = _logger(verbose)
+    log(f"🧠 [backtrack_schedule] Start: courses={len(course_list)} slots={len(slot_list)} fixed={len(fixed_slot_assignment)} (AM-only even)", flush=True)
     slot_assignment = fixed_slot_assignment.copy()
-    neighbors = conflict_map
-
-    def is_valid(course, slot):
-        for neighbor in neighbors.get(course, []):
-            if slot_assignment.get(neighbor) == slot:
-                return False
-        return True
-
-    calls = 0
-    last_report = _now_ms()
     t0 = _now_ms()
+    last_report = t0
+    calls = 0
 
-    order = sorted([c for c in course_list if c not in slot_assignment],
-                   key=lambda c: len(neighbors.get(c, [])),
-                   reverse=True)
+    def finish(stop):
+        log(f"🧠 [backtrack_schedule] {'SUCCESS' if stop == 'complete' else 'FAIL (' + stop + ')'} "
+              f"in {_fmt_ms(_now_ms() - t0)} with {calls} calls", flush=True)
+        if report is not None:
+            report.update(stop=stop, calls=calls)
+        return slot_assignment if stop == "complete" else None
+
+    slot_pos = {s: k for k, s in enumerate(slot_list)}
+    full = (1 << len(slot_list)) - 1
+    free = [c for c in dict.fromkeys(course_list) if c not in slot_assignment]
+    dom = {c: full for c in free}
+    for c_fixed, sl in fixed_slot_assignment.items():
+        if sl in slot_pos:
+            for n in conflict_map.get(c_fixed, ()):
+                if n in dom:
+                    dom[n] &= ~(1 << slot_pos[sl])
+    if any(d == 0 for d in dom.values()):
+        return finish("infeasible")
+
+    degree = {c: len(conflict_map.get(c, ())) for c in free}
+    pruned_by = {c: 0 for c in free}  # depths (bitmask) whose placement removed a value from c
+    heap = []
+
+    def push(c):
+        heapq.heappush(heap, (dom[c].bit_count(), -degree[c], c))
+
+    for c in free:
+        push(c)
+
+    def select():
+        while heap:
+            size, _, c = heapq.heappop(heap)
+            if c in dom and c not in slot_assignment and size == dom[c].bit_count():
+                return c
+        return None
+
+    # One frame per depth: [course, untried values, current value bit, trail, conflict set]
+    stack = []
+
+    def undo(depth, frame):
+        bit, trail = frame[2], frame[3]
+        for n in trail:
+            dom[n] |= bit
+            pruned_by[n] &= ~(1 << depth)
+            push(n)
+        frame[2], frame[3] = 0, []
+
+    if free:
+        v = select()
+        stack.append([v, dom[v], 0, [], 0])
+
+    while stack:
+        depth = len(stack) - 1
+        frame = stack[-1]
+        v = frame[0]
+        if frame[2]:
+            undo(depth, frame)
+            del slot_assignment[v]
 
-    def backtrack(index):
-        nonlocal calls, last_report
         calls += 1
-
         if calls > max_calls_per_attempt:
-            return False
-        if _now_ms() - t0 > max_ms_per_attempt:
-            return False
-
+            return finish("calls")
         now = _now_ms()
+        if now - t0 > max_ms_per_attempt:
+            return finish("time")
+        if should_stop is not None and should_stop():
+            return finish("stopped")
         if now - last_report > 2000:
-            assigned = len(slot_assignment)
-            print(f"    ⏳ backtrack heartbeat: idx={index}/{len(order)} assigned={assigned} calls={calls}", flush=True)
+            log(f"    ⏳ backtrack heartbeat: depth={depth}/{len(free)} calls={calls}", flush=True)
             last_report = now
 
-        if index == len(order):
-            return True
-
-        course = order[index]
-        for slot in slot_list:
-            if is_valid(course, slot):
-                slot_assignment[course] = slot
-                if backtrack(index + 1):
-                    return True
-                del slot_assignment[course]
-        return False
+        if frame[1]:
+            bit = frame[1] & -frame[1]
+            frame[1] ^= bit
+            frame[2] = bit
+            slot_assignment[v] = slot_list[bit.bit_length() - 1]
+            wiped = None
+            for n in conflict_map.get(v, ()):
+                if n in dom and n not in slot_assignment and dom[n] & bit:
+                    dom[n] ^= bit
+                    pruned_by[n] |= 1 << depth
+                    frame[3].append(n)
+                    if not dom[n]:
+                        wiped = n
+                        break
+                    push(n)
+            if wiped is not None:
+                # The courses that emptied this domain share the blame for the value
+                frame[4] |= pruned_by[wiped] & ~(1 << depth)
+                continue
+            if len(stack) == len(free):
+                return finish("complete")
+            nxt = select()
+            stack.append([nxt, dom[nxt], 0, [], 0])
+            continue
 
-    success = backtrack(0)
-    print(f"🧠 [backtrack_schedule] {'SUCCESS' if success else 'FAIL'} in {_fmt_ms(_now_ms() - t0)} with {calls} calls", flush=True)
-    return slot_assignment if success else None
+        # Every value failed: jump back to the deepest course responsible
+        culprits = (frame[4] | pruned_by[v]) & ~(1 << depth)
+        if not culprits:
+            return finish("infeasible")
+        target = culprits.bit_length() - 1
+        stack.pop()
+        push(v)
+        while len(stack) - 1 > target:
+            d = len(stack) - 1
+            f = stack.pop()
+            if f[2]:
+                undo(d, f)
+                del slot_assignment[f[0]]
+            push(f[0])
+        stack[target][4] |= culprits & ~(1 << target)
+
+    return finish("complete" if not free else "infeasible")
 
 
 def expand_grouped_course_slots(course_slot_map, group_map, course_map):
@@ -320,87 +687,65 @@ def expand_grouped_course_slots(course_slot_map, group_map, course_map):
     return expanded_map
 
 
-def rebuild_course_to_students_with_names(course_to_students, course_map, course_to_group):
+def rebuild_course_to_students_with_names(enrollment, course_map):
+    """
+    enrollment: the raw (pre-merge) Enrollment from load_enrollment.
+    Re-keyed in memory by (code, name) with names resolved the same way as
+    expand_grouped_course_slots; no extra database reads.
+    """
     print("🔁 [rebuild_course_to_students_with_names] start", flush=True)
-    from db.session import SessionLocal as _SessionLocal
-    from db.models import CourseStudent as _CourseStudent, Course as _Course, Student as _Student
-
-    db = _SessionLocal()
-
     code_to_name = {code: name for _, (code, name) in course_map.items()}
 
-    all_mappings = db.query(_CourseStudent).all()
-    all_students = {s.id: s.student_id1 for s in db.query(_Student).all()}
-    all_courses = {c.id: c for c in db.query(_Course).all()}
+    rebuilt = enrollment.map_courses(lambda course: (course[0], code_to_name.get(course[0], "Unknown Course")))
 
-    print(f"  • CourseStudent rows: {len(all_mappings)}  • Students cached: {len(all_students)}  • Courses cached: {len(all_courses)}", flush=True)
+    print(f"✅ [rebuild_course_to_students_with_names] done  • courses={rebuilt.num_courses}", flush=True)
+    return rebuilt
 
-    rebuilt = defaultdict(set)
 
-    for idx, m in enumerate(all_mappings, 1):
-        course = all_courses.get(m.course_id)
-        student_id = all_students.get(m.student_id)
-        if not course or not student_id:
-            continue
+def build_schedule_frame(named_enrollment, course_slot_map, student_names, start_date):
+    """
+    One row per (student, course) of the named enrollment, built column-wise from the
+    CSR arrays instead of a per-row dict loop.
+    """
+    print("🧾 Building final dataframe…", flush=True)
+    n = named_enrollment.num_courses
+    codes = np.empty(n, dtype=object)
+    names = np.empty(n, dtype=object)
+    days = np.empty(n, dtype=object)
+    times = np.empty(n, dtype=object)
+    slots = np.empty(n, dtype=object)
 
-        course_code = course.course_code
-        course_name = code_to_name.get(course_code, "Unknown Course")
-        rebuilt[(course_code, course_name)].add(student_id)
+    missing_slots = 0
+    for i, (course_code, course_name) in enumerate(named_enrollment.course_keys):
+        slot = course_slot_map.get((course_code, course_name), None)
+        if slot is None:
+            missing_slots += 1
+        codes[i], names[i] = course_code, course_name
+        days[i], times[i] = get_day_and_time(slot, start_date) if slot is not None else ("Unscheduled", "")
+        slots[i] = slot if slot is not None else "N/A"
 
-        if idx % 10000 == 0:
-            print(f"    … processed {idx} mappings", flush=True)
+    if missing_slots:
+        print(f"  ⚠️ Courses without slots after expansion: {missing_slots}", flush=True)
 
-    db.close()
-    print("✅ [rebuild_course_to_students_with_names] done", flush=True)
-    return rebuilt
+    row_course = np.repeat(np.arange(n), named_enrollment.course_sizes)
+    student_keys = np.array(named_enrollment.student_keys, dtype=object)
+    student_ids = student_keys[named_enrollment.course_students]
+    student_name_col = np.array([student_names.get(s, "Unknown") for s in named_enrollment.student_keys], dtype=object)
+
+    return pd.DataFrame({
+        "Student ID": student_ids,
+        "Student Name": student_name_col[named_enrollment.course_students],
+        "Course Code": codes[row_course],
+        "Course Name": names[row_course],
+        "Day": days[row_course],
+        "Time": times[row_course],
+        "Slot #": slots[row_course],
+    })
 
 
 # -------------------------
 # IMPROVED: 3-in-3 detector & repair (order-aware)
 # -------------------------
-def _compute_student_slots_map(course_slot_map, student_to_courses):
-    student_slots = defaultdict(set)
-    student_courses_by_slot = defaultdict(lambda: defaultdict(list))
-    for student, courses in student_to_courses.items():
-        for c in courses:
-            if c in course_slot_map:
-                sl = course_slot_map[c]
-                student_slots[student].add(sl)
-                student_courses_by_slot[student][sl].append(c)
-    return student_slots, student_courses_by_slot
-
-def _detect_violations_order_aware(student_slots, day_slots):
-    slot_to_day, _ = _build_slot_day_maps(day_slots)
-    num_days = len(day_slots)
-    violations = []
-    for stu, sset in student_slots.items():
-        triples = _triples_from_slots_order_aware(sset, slot_to_day, num_days)
-        for t in triples:
-            violations.append((stu, t))
-    return violations
-
-def _slot_load(course_slot_map):
-    return Counter(course_slot_map.values())
-
-def _course_violation_weight(course, student_slots, student_courses_by_slot, day_slots):
-    slot_to_day, _ = _build_slot_day_maps(day_slots)
-    num_days = len(day_slots)
-    count = 0
-    for stu, slots in student_slots.items():
-        triples = _triples_from_slots_order_aware(slots, slot_to_day, num_days)
-        if not triples:
-            continue
-        for (d0, d1, d2) in triples:
-            # translate back to slots for membership check
-            s0 = day_slots[d0]; s1 = day_slots[d1]; s2 = day_slots[d2]
-            if course in student_courses_by_slot.get(stu, {}).get(s0, []): 
-                count += 1; continue
-            if course in student_courses_by_slot.get(stu, {}).get(s1, []): 
-                count += 1; continue
-            if course in student_courses_by_slot.get(stu, {}).get(s2, []): 
-                count += 1; continue
-    return count
-
 def _candidate_slots_rank(preferred, loads, current_slot, avoid_soft=None):
     avoid_soft = avoid_soft or set()
     def key(s):
@@ -408,18 +753,15 @@ def _candidate_slots_rank(preferred, loads, current_slot, avoid_soft=None):
         return (penalty, loads.get(s, 0), -abs(s - current_slot))
     return sorted(preferred, key=key)
 
-def _try_move_course(course, course_slot_map, conflict_map, course_to_students,
-                     preferred_slots, student_slots, current_slot,
+def _try_move_course(course, conflict_map, course_to_students, state, current_slot,
                      target_student=None, target_triplet=None):
     neighbors = conflict_map.get(course, set())
     enrolled_students = course_to_students.get(course, set())
-    loads = _slot_load(course_slot_map)
+    assignment = state.assignment
 
-    neighbor_slots = {course_slot_map[n] for n in neighbors if n in course_slot_map}
+    neighbor_slots = {assignment[n] for n in neighbors if n in assignment}
 
-    # Build order-aware maps
-    day_slots = preferred_slots[:]  # the active day set
-    slot_to_day, _ = _build_slot_day_maps(day_slots)
+    day_slots = state.day_slots  # the active day set
     num_days = len(day_slots)
 
     avoid_soft = set()
@@ -434,60 +776,41 @@ def _try_move_course(course, course_slot_map, conflict_map, course_to_students,
                     avoid_soft.add(day_slots[x])
 
     candidates = [s for s in day_slots if s != current_slot and s not in neighbor_slots]
-    candidates = _candidate_slots_rank(candidates, loads, current_slot, avoid_soft)
-
-    per_student_sets = {stu: set(student_slots.get(stu, set())) for stu in enrolled_students}
+    candidates = _candidate_slots_rank(candidates, state.slot_load, current_slot, avoid_soft)
 
     for cand in candidates:
-        ok_for_all = True
-        for stu in enrolled_students:
-            if _triple_would_be_created_order_aware(per_student_sets[stu], cand, slot_to_day, num_days, old_slot=current_slot):
-                ok_for_all = False
-                break
-        if not ok_for_all:
+        if any(state.would_create_triple(stu, cand, old_slot=current_slot) for stu in enrolled_students):
             continue
         return cand
 
     return None
 
-def _swap_would_be_valid(courseA, slotA, courseB, slotB, course_slot_map, conflict_map,
-                         course_to_students, student_slots, day_slots):
-    slot_to_day, _ = _build_slot_day_maps(day_slots)
-    num_days = len(day_slots)
-
+def _swap_would_be_valid(courseA, slotA, courseB, slotB, conflict_map, course_to_students, state):
+    assignment = state.assignment
     neighA = conflict_map.get(courseA, set())
     neighB = conflict_map.get(courseB, set())
 
     for n in neighA:
-        if n in course_slot_map and course_slot_map[n] == slotB:
+        if n in assignment and assignment[n] == slotB:
             return False
     for n in neighB:
-        if n in course_slot_map and course_slot_map[n] == slotA:
+        if n in assignment and assignment[n] == slotA:
             return False
 
     for stu in course_to_students.get(courseA, set()):
-        sset = set(student_slots.get(stu, set()))
-        if slotA in sset:
-            sset.remove(slotA)
-        sset.add(slotB)
-        if len(_triples_from_slots_order_aware(sset, slot_to_day, num_days)) > 0:
+        if state.would_create_triple(stu, slotB, old_slot=slotA):
             return False
 
     for stu in course_to_students.get(courseB, set()):
-        sset = set(student_slots.get(stu, set()))
-        if slotB in sset:
-            sset.remove(slotB)
-        sset.add(slotA)
-        if len(_triples_from_slots_order_aware(sset, slot_to_day, num_days)) > 0:
+        if state.would_create_triple(stu, slotA, old_slot=slotB):
             return False
 
     return True
 
-def _try_swap_course(course, current_slot, course_slot_map, conflict_map,
-                     course_to_students, student_slots, preferred_slots,
+def _try_swap_course(course, current_slot, conflict_map, course_to_students, state,
                      target_student=None, target_triplet=None):
-    day_slots = preferred_slots[:]
-    loads = _slot_load(course_slot_map)
+    day_slots = state.day_slots
+    loads = state.slot_load
 
     avoid_soft = set()
     if target_student is not None and target_triplet is not None:
@@ -499,43 +822,44 @@ def _try_swap_course(course, current_slot, course_slot_map, conflict_map,
                 if 0 <= x < len(day_slots):
                     avoid_soft.add(day_slots[x])
 
-    occupied_targets = [s for s in day_slots if s != current_slot and s in loads]
+    occupied_targets = [s for s in day_slots if s != current_slot and loads[s] > 0]
     occupied_targets = _candidate_slots_rank(occupied_targets, loads, current_slot, avoid_soft)
 
-    slot_to_courses = defaultdict(list)
-    for c, sl in course_slot_map.items():
-        slot_to_courses[sl].append(c)
-
     def partner_weight(cc):
-        # approximate by how many of its students are currently in any triple
-        slot_to_day, _ = _build_slot_day_maps(day_slots)
-        num_days = len(day_slots)
-        cnt = 0
-        for stu in course_to_students.get(cc, set()):
-            if _triples_from_slots_order_aware(student_slots.get(stu, set()), slot_to_day, num_days):
-                cnt += 1
-        return (len(course_to_students.get(cc, set())), cnt)
+        # small courses first, then the ones least involved in triples
+        return (len(course_to_students.get(cc, set())), state.course_weight[cc])
 
     for tgt_slot in occupied_targets:
-        partners = sorted(slot_to_courses.get(tgt_slot, []), key=partner_weight)
+        partners = sorted(state.slot_courses[tgt_slot], key=partner_weight)
         for partner in partners:
             if partner == course:
                 continue
             if not _swap_would_be_valid(course, current_slot, partner, tgt_slot,
-                                        course_slot_map, conflict_map, course_to_students, student_slots, day_slots):
+                                        conflict_map, course_to_students, state):
                 continue
             return partner, tgt_slot
 
     return None, None
 
 def repair_3_in_3(course_slot_map, course_to_students, student_to_courses, conflict_map, preferred_slots,
-                  max_passes=10, max_moves=2000, enable_swaps=True):
+                  max_passes=10, max_moves=2000, enable_swaps=True, time_limit_seconds=None,
+                  weighted_degrees=None):
+    """
+    Greedy moves and safe swaps that break 3-in-3 triples. For each triple the student's
+    courses on those days are tried smallest first, then most involved in triples, then
+    (weighted_degrees, optional) least co-enrolled with their conflict neighbors, as
+    those have the most room to move.
+    """
     print("🛠️ [repair_3_in_3] start (moves + safe swaps, order-aware)", flush=True)
+    t0 = time.time()
+
+    def out_of_time():
+        return time_limit_seconds is not None and time.time() - t0 > time_limit_seconds
 
     day_slots = preferred_slots[:]
-    student_slots, student_courses_by_slot = _compute_student_slots_map(course_slot_map, student_to_courses)
-    initial = _detect_violations_order_aware(student_slots, day_slots)
-    print(f"  • Initial violations: {len(initial)}", flush=True)
+    # Live loads, buckets and triples per student / course; each move re-counts only the moved courses' students
+    state = ScheduleState(day_slots, course_slot_map, course_to_students, student_to_courses)
+    print(f"  • Initial violations: {state.triple_count()}", flush=True)
 
     moves_done = 0
     passes = 0
@@ -546,22 +870,18 @@ def repair_3_in_3(course_slot_map, course_to_students, student_to_courses, confl
         s_mid = day_slots[d1]
         s_left = day_slots[d0]
         s_right = day_slots[d2]
-        mid = student_courses_by_slot.get(stu, {}).get(s_mid, [])
-        left = student_courses_by_slot.get(stu, {}).get(s_left, [])
-        right = student_courses_by_slot.get(stu, {}).get(s_right, [])
-        for c in mid:   cands.append((c, s_mid))
-        for c in left:  cands.append((c, s_left))
-        for c in right: cands.append((c, s_right))
+        for c in state.courses_on(stu, s_mid):   cands.append((c, s_mid))
+        for c in state.courses_on(stu, s_left):  cands.append((c, s_left))
+        for c in state.courses_on(stu, s_right): cands.append((c, s_right))
         def key(cs):
             c, _ = cs
-            return (len(course_to_students.get(c, set())),
-                    -_course_violation_weight(c, student_slots, student_courses_by_slot, day_slots))
+            wdeg = int(weighted_degrees[c]) if weighted_degrees is not None else 0
+            return (len(course_to_students.get(c, set())), -state.course_weight[c], wdeg)
         return sorted(cands, key=key)
 
     while passes < max_passes:
         passes += 1
-        student_slots, student_courses_by_slot = _compute_student_slots_map(course_slot_map, student_to_courses)
-        violations = _detect_violations_order_aware(student_slots, day_slots)
+        violations = state.violations()
         print(f"  • Pass {passes}: current violations={len(violations)}", flush=True)
         if not violations:
             break
@@ -582,11 +902,9 @@ def repair_3_in_3(course_slot_map, course_to_students, student_to_courses, confl
 
                 new_slot = _try_move_course(
                     course=course,
-                    course_slot_map=course_slot_map,
                     conflict_map=conflict_map,
                     course_to_students=course_to_students,
-                    preferred_slots=day_slots,
-                    student_slots=student_slots,
+                    state=state,
                     current_slot=cur_slot,
                     target_student=stu,
                     target_triplet=triple
@@ -594,50 +912,38 @@ def repair_3_in_3(course_slot_map, course_to_students, student_to_courses, confl
 
                 if new_slot is not None:
                     print(f"    ↪️ Move {course}  {cur_slot} → {new_slot}  (student={stu})", flush=True)
-                    course_slot_map[course] = new_slot
+                    state.move_courses({course: new_slot})
                     moved_courses_this_pass.add(course)
                     moves_done += 1
                     changed = True
-
-                    for st in course_to_students.get(course, set()):
-                        if cur_slot in student_slots[st]:
-                            student_slots[st].remove(cur_slot)
-                        student_slots[st].add(new_slot)
                     break
 
                 if enable_swaps:
                     partner, tgt_slot = _try_swap_course(
                         course=course,
                         current_slot=cur_slot,
-                        course_slot_map=course_slot_map,
                         conflict_map=conflict_map,
                         course_to_students=course_to_students,
-                        student_slots=student_slots,
-                        preferred_slots=day_slots,
+                        state=state,
                         target_student=stu,
                         target_triplet=triple
                     )
                     if partner is not None:
                         print(f"    🔁 Swap {course}@{cur_slot} ↔ {partner}@{tgt_slot}  (student={stu})", flush=True)
-                        course_slot_map[course], course_slot_map[partner] = tgt_slot, cur_slot
+                        state.move_courses({course: tgt_slot, partner: cur_slot})
                         moved_courses_this_pass.add(course)
                         moved_courses_this_pass.add(partner)
                         moves_done += 1
                         changed = True
-
-                        for st in course_to_students.get(course, set()):
-                            if cur_slot in student_slots[st]:
-                                student_slots[st].remove(cur_slot)
-                            student_slots[st].add(tgt_slot)
-                        for st in course_to_students.get(partner, set()):
-                            if tgt_slot in student_slots[st]:
-                                student_slots[st].remove(tgt_slot)
-                            student_slots[st].add(cur_slot)
                         break
 
-            if moves_done >= max_moves:
+            if moves_done >= max_moves or out_of_time():
                 break
 
+        if out_of_time():
+            print("  • Reached time limit; stopping.", flush=True)
+            break
+
         if not changed:
             print("  • No improving move/swap found in this pass; stopping.", flush=True)
             break
@@ -646,37 +952,166 @@ def repair_3_in_3(course_slot_map, course_to_students, student_to_courses, confl
             print("  • Reached move/swap cap; stopping.", flush=True)
             break
 
-    student_slots, _ = _compute_student_slots_map(course_slot_map, student_to_courses)
-    final_violations = _detect_violations_order_aware(student_slots, day_slots)
-    print(f"✅ [repair_3_in_3] done  • moves/swaps={moves_done}  • remaining_violations={len(final_violations)}", flush=True)
-    return course_slot_map, len(final_violations)
+    remaining = state.triple_count()
+    print(f"✅ [repair_3_in_3] done  • moves/swaps={moves_done}  • remaining_violations={remaining}", flush=True)
+    return course_slot_map, remaining
+
+
+# -------------------------
+# Tabu search: delta-evaluated 3-in-3 minimization
+# -------------------------
+def tabu_search_triples(course_slot_map, course_to_students, student_to_courses, conflict_map, day_slots,
+                        fixed_slot_assignment=None, time_limit_seconds=15.0, max_iters=200_000,
+                        sample_size=40, seed=0):
+    """
+    Tabu search for fewer 3-in-3 triples. For (a sample of) the courses currently in a
+    triple, every other day is a candidate: a plain move when no conflicting neighbor
+    sits there, otherwise the Kempe-chain interchange of the two slots through that
+    course. Both keep every hard conflict satisfied; fixed courses never move.
+    Candidates are scored by their exact delta (ScheduleState.moves_delta, O(students of
+    the moved courses)) and the best is taken even when it is sideways or uphill.
+    Returning a course to a slot it just left is tabu for a randomized tenure, unless
+    that reaches a new best. Returns (best assignment, its triple count).
+    """
+    fixed = fixed_slot_assignment or {}
+    rnd = random.Random(seed)
+    assignment = dict(course_slot_map)
+    state = ScheduleState(day_slots, assignment, course_to_students, student_to_courses)
+    current = state.triple_count()
+    best, best_map = current, dict(assignment)
+    print(f"🧭 [tabu] start  • triples={current}  • budget={time_limit_seconds:.1f}s", flush=True)
+
+    t0 = time.time()
+    last_report = t0
+    tabu_until = {}  # (course, slot) -> iteration it stays tabu until
+    it = 0
+    while best > 0 and it < max_iters:
+        it += 1
+        now = time.time()
+        if now - t0 > time_limit_seconds:
+            break
+        if now - last_report > 2:
+            print(f"    ⏳ tabu heartbeat: iter={it} current={current} best={best}", flush=True)
+            last_report = now
+
+        hot = [c for c, w in state.course_weight.items() if w > 0 and c not in fixed]
+        sampled = len(hot) > sample_size
+        if sampled:
+            hot = rnd.sample(hot, sample_size)
+
+        chosen, chosen_delta = None, None
+        scored_chains = set()  # (course, slot) pairs already covered by a scored Kempe chain
+        for c in hot:
+            cur = assignment[c]
+            blocked = {assignment[n] for n in conflict_map.get(c, ()) if n in assignment}
+            for sl in day_slots:
+                if sl == cur or (c, sl) in scored_chains:
+                    continue
+                if sl in blocked:
+                    chain = _kempe_chain([c], cur, sl, assignment, conflict_map)
+                    if any(x in fixed for x in chain):
+                        continue
+                    moves = {x: (sl if assignment[x] == cur else cur) for x in chain}
+                    scored_chains.update(moves.items())
+                else:
+                    moves = {c: sl}
+                delta = state.moves_delta(moves)
+                if tabu_until.get((c, sl), 0) > it and current + delta >= best:
+                    continue
+                if chosen_delta is None or delta < chosen_delta or (delta == chosen_delta and rnd.random() < 0.5):
+                    chosen, chosen_delta = moves, delta
+        if chosen is None:
+            if not sampled:
+                break  # every course in a triple is fixed or boxed in by conflicts
+            continue
+
+        tenure = 2 + rnd.randrange(10) + current // 10
+        for c in chosen:
+            tabu_until[(c, assignment[c])] = it + tenure
+        state.move_courses(chosen)
+        current += chosen_delta
+        if current < best:
+            best, best_map = current, dict(assignment)
+
+    print(f"🧭 [tabu] done  • iters={it}  • best triples={best}  • {time.time() - t0:.2f}s", flush=True)
+    return best_map, best
 
 
 # -------------------------
 # CP-SAT Finisher: minimize 3-in-3 triples (order-aware, with bound)
 # -------------------------
-def optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, fixed_slot_assignment,
-                            current_assignment, day_slots, current_best_triples=None,
-                            time_limit_seconds=45.0, workers=8):
+CP_SAT_CONFLICT_ENCODINGS = ("pairwise", "clique", "alldiff")
+
+
+def _conflict_cliques(course_list, conflict_map, student_to_courses):
     """
-    course_list: merged course ids
-    day_slots: list of even slots in exact day order currently used
-    current_best_triples: non-negative int -> adds constraint sum(y) ≤ current_best_triples (never worsen)
-    Returns improved dict[course] -> slot; or current_assignment if no improvement.
+    Clique cover of the conflict graph restricted to course_list. Each distinct student
+    course set is a clique; sets are taken largest first and kept only if they cover a
+    pair no earlier set did. Any conflict edge left over becomes a 2-clique.
     """
-    print("🧩 [cp-sat] Building model to minimize 3-in-3 (order-aware)…", flush=True)
-    try:
-        from ortools.sat.python import cp_model
-    except Exception as e:
-        print(f"⚠️ [cp-sat] OR-Tools not available: {e}. Skipping optimizer.", flush=True)
-        return current_assignment
+    course_set = set(course_list)
+    sets = {frozenset(c for c in courses if c in course_set) for courses in student_to_courses.values()}
+    cliques, covered = [], set()
+    for cs in sorted((cs for cs in sets if len(cs) >= 2), key=len, reverse=True):
+        members = sorted(cs)
+        pairs = {(a, b) for i, a in enumerate(members) for b in members[i + 1:]}
+        if not pairs <= covered:
+            covered |= pairs
+            cliques.append(members)
+    for c in course_list:
+        for n in conflict_map.get(c, ()):
+            if c < n and n in course_set and (c, n) not in covered:
+                covered.add((c, n))
+                cliques.append([c, n])
+    return cliques
 
+
+def _build_triples_model(cp_model, course_list, conflict_map, student_to_courses, fixed_slot_assignment,
+                         day_slots, current_best_triples=None, conflict_encoding="clique",
+                         context_assignment=None, verbose=True):
+    """
+    CP-SAT model behind optimize_triples_cp_sat. Returns (model, x) with x[c, d] the
+    course/day booleans.
+
+    context_assignment: optional {course: slot} for courses outside course_list that stay
+    where they are (LNS subproblems). Their days count as taken for their students and
+    are closed to their conflict neighbors in course_list.
+
+    conflict_encoding:
+      - 'pairwise': x[c,d] + x[n,d] <= 1 for every conflicting pair and day
+      - 'clique':   one AddAtMostOne per clique of _conflict_cliques per day
+      - 'alldiff':  integer day[c] channelled to x, one AddAllDifferent per clique
+
+    Only students with 3+ courses in course_list can form a triple, and students with
+    the same course set form the same triples, so y terms are built once per distinct
+    course set ("profile") and weighted by how many students share it. y is only
+    bounded from below, so the objective of a non-optimal solution can overcount the
+    triples of its x; the optimum and the never-worsen bound are exact.
+    verbose=False silences the size lines.
+    """
+    log = _logger(verbose)
+    if conflict_encoding not in CP_SAT_CONFLICT_ENCODINGS:
+        raise ValueError(f"unknown conflict_encoding {conflict_encoding!r}; expected one of {CP_SAT_CONFLICT_ENCODINGS}")
     num_days = len(day_slots)
     days = list(range(num_days))
+    course_set = set(course_list)
 
     # Map slot <-> day
     slot_to_day, _ = _build_slot_day_maps(day_slots)
 
+    # At-risk students only, one weighted term per distinct (course set, context days)
+    context = context_assignment or {}
+    profiles = Counter()
+    for s, courses in student_to_courses.items():
+        cs = frozenset(c for c in courses if c in course_set)
+        busy = frozenset(slot_to_day[context[c]] for c in courses if context.get(c) in slot_to_day)
+        if cs and len(cs) + len(busy) >= 3:
+            profiles[(cs, busy)] += 1
+    num_students = len(student_to_courses)
+    at_risk = sum(profiles.values())
+    log(f"🧩 [cp-sat] triple terms: students={num_students} → at-risk={at_risk} → profiles={len(profiles)}  "
+          f"• y vars {num_students * (num_days - 2)} → {len(profiles) * (num_days - 2)}", flush=True)
+
     model = cp_model.CpModel()
 
     # Vars
@@ -690,57 +1125,104 @@ def optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, fixed
         model.Add(sum(x[(c, d)] for d in days) == 1)
 
     # Conflicts not same day
-    seen_pairs = set()
-    for c in course_list:
-        for n in conflict_map.get(c, set()):
-            if (n, c) in seen_pairs or (c, n) in seen_pairs:
-                continue
-            seen_pairs.add((c, n))
-            for d in days:
-                model.Add(x[(c, d)] + x[(n, d)] <= 1)
+    if conflict_encoding == "pairwise":
+        seen_pairs = set()
+        for c in course_list:
+            for n in conflict_map.get(c, set()):
+                if n not in course_set or (n, c) in seen_pairs or (c, n) in seen_pairs:
+                    continue
+                seen_pairs.add((c, n))
+                for d in days:
+                    model.Add(x[(c, d)] + x[(n, d)] <= 1)
+        log(f"🧩 [cp-sat] conflicts: {len(seen_pairs)} pairs × {num_days} days", flush=True)
+    else:
+        cliques = _conflict_cliques(course_list, conflict_map, student_to_courses)
+        if conflict_encoding == "clique":
+            for clique in cliques:
+                for d in days:
+                    model.AddAtMostOne([x[(c, d)] for c in clique])
+        else:
+            day = {}
+            for c in course_list:
+                day[c] = model.NewIntVar(0, num_days - 1, f"day[{c}]")
+                model.Add(day[c] == sum(d * x[(c, d)] for d in days))
+            for clique in cliques:
+                model.AddAllDifferent([day[c] for c in clique])
+        log(f"🧩 [cp-sat] conflicts: {len(cliques)} cliques ({conflict_encoding}), "
+              f"largest={max(map(len, cliques), default=0)}", flush=True)
 
     # Fixed assignments within active days
     for c, slot in (fixed_slot_assignment or {}).items():
-        if c in course_list and slot in slot_to_day:
+        if c in course_set and slot in slot_to_day:
             dfix = slot_to_day[slot]
             model.Add(x[(c, dfix)] == 1)
 
-    # z[s,d]: student s has exam on day d
+    # Days held by conflicting context courses
+    for c in course_list:
+        for n in conflict_map.get(c, ()):
+            if context.get(n) in slot_to_day:
+                model.Add(x[(c, slot_to_day[context[n]])] == 0)
+
+    # z[p,d]: students of profile p have an exam on day d. A student's courses pairwise
+    # conflict, so at most one is on a day and z is their plain sum (1 on context days)
     z = {}
-    students = list(student_to_courses.keys())
+    students = list(profiles)
     for s in students:
         for d in days:
-            z[(s, d)] = model.NewBoolVar(f"z[{s},{d}]")
-            cs = [x[(c, d)] for c in student_to_courses.get(s, set()) if c in course_list]
-            if cs:
-                # z is OR of cs
-                # z >= any
-                for xc in cs:
-                    model.Add(z[(s, d)] >= xc)
-                # z <= sum(cs)
-                model.Add(z[(s, d)] <= sum(cs))
-            else:
-                model.Add(z[(s, d)] == 0)
+            z[(s, d)] = 1 if d in s[1] else sum(x[(c, d)] for c in s[0])
 
-    # y[s,d]: triple on (d,d+1,d+2)
+    # y[p,d]: triple on (d,d+1,d+2). Only forced up: minimizing keeps it 0 otherwise
     y = {}
     for s in students:
         for d in range(num_days - 2):
-            y[(s, d)] = model.NewBoolVar(f"y[{s},{d}]")
-            model.Add(y[(s, d)] <= z[(s, d)])
-            model.Add(y[(s, d)] <= z[(s, d + 1)])
-            model.Add(y[(s, d)] <= z[(s, d + 2)])
+            y[(s, d)] = model.NewBoolVar(f"y[{len(y)}]")
             model.Add(y[(s, d)] >= z[(s, d)] + z[(s, d + 1)] + z[(s, d + 2)] - 2)
 
-    # Objective and upper bound
-    total_triples = sum(y.values())
+    # Objective and upper bound (a profile's triple counts once per student sharing it)
+    total_triples = sum(profiles[s] * yv for (s, _), yv in y.items())
     if current_best_triples is not None:
         model.Add(total_triples <= int(current_best_triples))
     model.Minimize(total_triples)
 
+    proto = model.Proto()
+    log(f"🧩 [cp-sat] model size: vars={len(proto.variables)} constraints={len(proto.constraints)}", flush=True)
+    return model, x
+
+
+def optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, fixed_slot_assignment,
+                            current_assignment, day_slots, current_best_triples=None,
+                            time_limit_seconds=45.0, workers=8, conflict_encoding="clique",
+                            context_assignment=None, report=None, verbose=True):
+    """
+    course_list: merged course ids
+    day_slots: list of even slots in exact day order currently used
+    current_best_triples: non-negative int -> adds constraint sum(y) ≤ current_best_triples (never worsen)
+    conflict_encoding: 'pairwise' | 'clique' | 'alldiff' (see _build_triples_model)
+    context_assignment: courses held in place around course_list (see _build_triples_model)
+    report: optional dict, filled with status (CP-SAT status name) and objective
+    verbose=False silences the progress lines (OR-Tools' own search log is always off)
+    Returns improved dict[course] -> slot; or current_assignment if no improvement.
+    """
+    log = _logger(verbose)
+    log("🧩 [cp-sat] Building model to minimize 3-in-3 (order-aware)…", flush=True)
+    try:
+        from ortools.sat.python import cp_model
+    except Exception as e:
+        log(f"⚠️ [cp-sat] OR-Tools not available: {e}. Skipping optimizer.", flush=True)
+        return current_assignment
+
+    t0 = _now_ms()
+    days = list(range(len(day_slots)))
+    course_set = set(course_list)
+    slot_to_day, _ = _build_slot_day_maps(day_slots)
+    model, x = _build_triples_model(cp_model, course_list, conflict_map, student_to_courses,
+                                    fixed_slot_assignment, day_slots, current_best_triples, conflict_encoding,
+                                    context_assignment, verbose=verbose)
+    log(f"🧩 [cp-sat] model built in {_fmt_ms(_now_ms() - t0)}", flush=True)
+
     # Warm start
     for c, slot in (current_assignment or {}).items():
-        if c in course_list and slot in slot_to_day:
+        if c in course_set and slot in slot_to_day:
             dcur = slot_to_day[slot]
             model.AddHint(x[(c, dcur)], 1)
             for d in days:
@@ -751,12 +1233,17 @@ def optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, fixed
     solver = cp_model.CpSolver()
     solver.parameters.max_time_in_seconds = float(time_limit_seconds)
     solver.parameters.num_search_workers = int(workers)
-    print("🧩 [cp-sat] Solving…", flush=True)
+    solver.parameters.log_search_progress = False
+    solver.parameters.log_to_stdout = False
+    log("🧩 [cp-sat] Solving…", flush=True)
     status = solver.Solve(model)
-    print(f"🧩 [cp-sat] Status: {solver.StatusName(status)}  • objective={solver.ObjectiveValue()}", flush=True)
+    log(f"🧩 [cp-sat] Status: {solver.StatusName(status)}  • objective={solver.ObjectiveValue()}  "
+          f"• solve {solver.WallTime():.2f}s", flush=True)
+    if report is not None:
+        report.update(status=solver.StatusName(status), objective=solver.ObjectiveValue())
 
     if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        print("⚠️ [cp-sat] No solution under the bound; keeping current assignment.", flush=True)
+        log("⚠️ [cp-sat] No solution under the bound; keeping current assignment.", flush=True)
         return current_assignment
 
     # Extract
@@ -775,6 +1262,89 @@ def optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, fixed
     return new_assignment
 
 
+# -------------------------
+# CP-SAT LNS: re-solve small neighborhoods around the remaining triples
+# -------------------------
+def lns_triples_cp_sat(course_slot_map, course_to_students, student_to_courses, conflict_map, day_slots,
+                       fixed_slot_assignment=None, time_limit_seconds=60.0, sub_time_limit_seconds=0.3,
+                       neighborhood_size=40, workers=1, seed=0):
+    """
+    Large-neighborhood search with optimize_triples_cp_sat as the sub-solver. Each step
+    frees the courses of a few remaining triples plus their conflict neighbors (up to
+    neighborhood_size, fixed courses never), holds every other course in place as
+    context, and solves that small model for sub_time_limit_seconds from the incumbent.
+    The result is kept only when the full triple count drops (ScheduleState.moves_delta).
+    The neighborhood grows after a proven-optimal step without gain and shrinks after
+    a time-out. Stops at 0 triples or the deadline. Returns (assignment, triples).
+    """
+    fixed = fixed_slot_assignment or {}
+    rnd = random.Random(seed)
+    assignment = dict(course_slot_map)
+    state = ScheduleState(day_slots, assignment, course_to_students, student_to_courses)
+    current = state.triple_count()
+    size = neighborhood_size
+    print(f"🧱 [lns] start  • triples={current}  • budget={time_limit_seconds:.1f}s  • neighborhood={size}", flush=True)
+
+    t0 = time.time()
+    last_report = t0
+    steps = improved = 0
+    while current > 0:
+        now = time.time()
+        remaining = time_limit_seconds - (now - t0)
+        if remaining <= 0.05:
+            break
+        if now - last_report > 2:
+            print(f"    ⏳ lns heartbeat: step={steps} triples={current} neighborhood={size}", flush=True)
+            last_report = now
+        steps += 1
+
+        # Neighborhood: hot courses in random order, each with its conflict neighbors
+        hot = [c for c, w in state.course_weight.items() if w > 0 and c not in fixed]
+        rnd.shuffle(hot)
+        free = {}
+        for c in hot:
+            if len(free) >= size:
+                break
+            free[c] = None
+            neighbors = [n for n in conflict_map.get(c, ()) if n in assignment and n not in fixed and n not in free]
+            for n in rnd.sample(neighbors, min(len(neighbors), max(0, size - len(free)))):
+                free[n] = None
+        free = list(free)
+
+        students = {stu for c in free for stu in course_to_students.get(c, ())}
+        sub_students = {stu: student_to_courses[stu] for stu in students}
+        context = {c: assignment[c] for courses in sub_students.values() for c in courses
+                   if c in assignment and c not in free}
+        for c in free:
+            for n in conflict_map.get(c, ()):
+                if n in assignment and n not in free:
+                    context[n] = assignment[n]
+
+        report = {}
+        result = optimize_triples_cp_sat(
+            free, conflict_map, sub_students, fixed, {c: assignment[c] for c in free}, day_slots,
+            time_limit_seconds=min(sub_time_limit_seconds, remaining), workers=workers,
+            context_assignment=context, report=report, verbose=False
+        )
+        if not report:
+            break  # OR-Tools unavailable
+
+        moves = {c: sl for c, sl in result.items() if sl != assignment[c]}
+        delta = state.moves_delta(moves) if moves else 0
+        if delta < 0:
+            state.move_courses(moves)
+            current += delta
+            improved += 1
+        elif report["status"] == "OPTIMAL":
+            size = min(len(assignment), size + max(1, size // 4))
+        else:
+            size = max(8, size - max(1, size // 8))
+
+    print(f"🧱 [lns] done  • steps={steps}  • improving={improved}  • triples={current}  "
+          f"({time.time() - t0:.1f}s)", flush=True)
+    return assignment, current
+
+
 # -------------------------
 # Persist schedule to DB (one run + rows)
 # -------------------------
@@ -861,43 +1431,556 @@ def save_schedule_to_db(course_slot_map, rows, start_date, num_days, xml_file_id
         db.close()
 
 
+# -------------------------
+# Restart portfolio: (slot order, seed) jobs on a process pool
+# -------------------------
+# Below this many courses a restart takes milliseconds; the pool is never worth starting
+PORTFOLIO_MIN_COURSES = int(os.getenv("SCHEDULER_PORTFOLIO_MIN_COURSES", "150"))
+# Cold start of the pool (forkserver, scheduler import, first worker); an estimate until one is measured
+_POOL_STARTUP_MS = 2000
+
+_PORTFOLIO = {}  # worker side: the shared bound / stop rank, and the state of the run being served
+_POOL = {}  # parent side: the restart pool, started once per process and reused across runs
+_POOL_LOCK = threading.Lock()  # one run at a time owns the pool and its shared counters
+_POOL_CONTEXT = None
+_RUN_IDS = itertools.count()
+
+
+def _portfolio_worker_init(bound, stop_rank):
+    """Worker initializer: only the shared counters; each run's state is memory-mapped on first use."""
+    _PORTFOLIO.clear()
+    _PORTFOLIO.update(bound=bound, stop_rank=stop_rank)
+
+
+def _portfolio_ping(_):
+    return os.getpid()
+
+
+def _share_state(state, tmpdir):
+    """
+    The restart state with its arrays replaced by .npy paths the workers memory-map
+    read-only. Snapshot arrays already are memory-mapped .npy files and are passed by
+    path; arrays built in memory are written once to tmpdir.
+    """
+    def path_of(values, name):
+        if isinstance(values, np.memmap) and isinstance(values.base, mmap.mmap) and str(values.filename).endswith(".npy"):
+            return str(values.filename)
+        path = os.path.join(tmpdir, f"{name}.npy")
+        np.save(path, np.asarray(values))
+        return path
+
+    shared = {"run": next(_RUN_IDS), "csr": {}, "arrays": {}, "values": {}}
+    for key, value in state.items():
+        if isinstance(value, CSRMapping):
+            ptr, members = value.arrays()
+            shared["csr"][key] = (path_of(ptr, f"{key}_ptr"), path_of(members, f"{key}_members"))
+        elif isinstance(value, np.ndarray):
+            shared["arrays"][key] = path_of(value, key)
+        else:
+            shared["values"][key] = value
+    return shared
+
+
+def _portfolio_state(shared):
+    """Worker side: the run's state, memory-mapped once per worker and run."""
+    if _PORTFOLIO.get("run") != shared["run"]:
+        def load(path):
+            return np.load(path, mmap_mode="r")
+
+        state = dict(shared["values"])
+        state.update({key: CSRMapping(load(ptr), load(members)) for key, (ptr, members) in shared["csr"].items()})
+        state.update({key: load(path) for key, path in shared["arrays"].items()})
+        _PORTFOLIO.update(run=shared["run"], state=state)
+    return _PORTFOLIO["state"]
+
+
+def _color_restart(state, day_limit, pref_slots, seed, upper_bound=None, report=None, should_stop=None,
+                   verbose=True):
+    """
+    One restart: DSATUR in this slot order, capped backtracking as the fallback when
+    DSATUR runs out of slots. A restart pruned by upper_bound returns None without
+    trying the fallback, so a restart whose DSATUR would later have run out of slots,
+    and whose backtracked coloring might have beaten the bound, is dropped as well.
+    state["deadline"] (optional, time.time()) shortens the backtracking cap to the time
+    left; should_stop (optional callable) abandons the backtracking. verbose=False
+    silences both colorers.
+    """
+    report = {} if report is None else report
+    slots = pref_slots[:day_limit]
+    fixed = state["fixed_slot_assignment"]
+    ds = _dsatur_color(
+        state["course_list"],
+        state["conflict_map"],
+        max_colors=day_limit,
+        preferred_slots=slots,
+        fixed_slot_assignment=fixed,
+        course_to_students=state["course_to_students"],
+        seed=seed,
+        weighted_degrees=state["weighted_degrees"],
+        upper_bound=upper_bound,
+        report=report,
+        verbose=verbose
+    )
+    if ds is not None or report.get("stop") == "bound":
+        return ds
+    max_ms = 10000
+    if state.get("deadline") is not None:
+        max_ms = int(min(max_ms, max(500, (state["deadline"] - time.time()) * 1000)))
+    return backtrack_schedule(
+        [c for c in state["course_list"] if c not in fixed],
+        state["conflict_map"], slots, fixed,
+        max_ms_per_attempt=max_ms, max_calls_per_attempt=2_000_000, should_stop=should_stop,
+        verbose=verbose
+    )
+
+
+def _count_triples(assign_map, day_slots, course_to_students):
+    return DayOccupancy.from_assignment(day_slots, assign_map, course_to_students).triple_count()
+
+
+def _run_restart(state, bound, stop_rank, order_idx, seed, day_limit, rank):
+    """
+    One portfolio job. The per-restart solver chatter is dropped, the caller logs each
+    result. bound is the shared DSATUR upper bound; the job gives up its backtracking
+    once stop_rank.value drops below its own rank.
+    """
+    t0 = _now_ms()
+    pref = state["slot_orders"][order_idx]
+    report = {}
+    assignment = _color_restart(state, day_limit, pref, seed, upper_bound=bound, report=report,
+                                should_stop=lambda: rank > stop_rank.value, verbose=False)
+    if assignment is None:
+        triples = None
+    elif report.get("stop") == "complete":
+        triples = report["triples"]
+    else:  # backtracking result
+        triples = _count_triples(assignment, pref[:day_limit], state["course_to_students"])
+    return order_idx, seed, triples, assignment, _now_ms() - t0, report
+
+
+def _restart_job(shared, order_idx, seed, day_limit, rank=0):
+    """Runs in a worker: _run_restart on the memory-mapped state and the pool's shared counters."""
+    return _run_restart(_portfolio_state(shared), _PORTFOLIO["bound"], _PORTFOLIO["stop_rank"],
+                        order_idx, seed, day_limit, rank)
+
+
+def _pool_context():
+    # Never fork: the Streamlit server is multi-threaded, and a forked child can inherit a lock
+    # some other thread held. forkserver forks workers from a clean single-threaded server
+    # with the scheduler already imported; spawn is the portable fallback. Chosen once per process.
+    global _POOL_CONTEXT
+    if _POOL_CONTEXT is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _POOL_CONTEXT = multiprocessing.get_context("forkserver")
+            _POOL_CONTEXT.set_forkserver_preload([__name__])
+        else:
+            _POOL_CONTEXT = multiprocessing.get_context("spawn")
+    return _POOL_CONTEXT
+
+
+def _portfolio_pool(workers):
+    """
+    The restart pool, started on first use and reused by later runs while the worker
+    count stays the same. Every worker is started before this returns, and the time
+    that took becomes the new _POOL_STARTUP_MS.
+    """
+    global _POOL_STARTUP_MS
+    if _POOL.get("workers") == workers:
+        return _POOL
+    shutdown_portfolio_pool()
+    t0 = _now_ms()
+    ctx = _pool_context()
+    bound, stop_rank = ctx.RawValue("i", -1), ctx.RawValue("i", 0)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                   initializer=_portfolio_worker_init, initargs=(bound, stop_rank))
+    list(executor.map(_portfolio_ping, range(workers)))
+    _POOL_STARTUP_MS = _now_ms() - t0
+    _POOL.update(executor=executor, workers=workers, bound=bound, stop_rank=stop_rank)
+    print(f"🧵 [portfolio] started {workers} worker(s) in {_fmt_ms(_POOL_STARTUP_MS)}", flush=True)
+    return _POOL
+
+
+def shutdown_portfolio_pool():
+    """Stop the restart pool's workers; the next pooled run starts a new pool."""
+    executor = _POOL.get("executor")
+    _POOL.clear()
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_portfolio_pool)
+
+
+def run_restart_portfolio(state, jobs, day_limit, workers=None):
+    """
+    Run (order_idx, seed) restarts, on the process pool when that pays, streaming
+    results back as they finish. The best triple count so far is shared with the
+    workers as the DSATUR upper bound, so restarts whose DSATUR coloring cannot win
+    stop early (and skip the backtracking fallback, see _color_restart). Once a
+    restart reaches 0 pre-repair triples, the later jobs not yet started are
+    cancelled. Returns (triples, assignment, order_idx, seed); ties go to the earliest
+    job, so the pick matches running the same (pruned) jobs in order. Past
+    state["deadline"] (optional, time.time()) no further results are awaited once
+    some restart has produced a schedule.
+
+    The pool is started once per process and kept (see _portfolio_pool); its workers
+    memory-map the state's arrays (see _share_state) instead of unpickling a copy.
+    The restarts run in-process when workers=1, the instance has fewer than
+    PORTFOLIO_MIN_COURSES courses, or another run holds the pool. Without a warm pool
+    the first restart runs in-process to price the rest, and the pool is started only
+    if running the remaining restarts in parallel would save more than the last
+    measured startup time (_POOL_STARTUP_MS) and the stage has that much time left.
+    Restarts still running when the portfolio stops are told to give up (shared stop
+    rank) and waited for, so no job outlives this call and competes with the next
+    stage for the CPU budget.
+    """
+    workers = workers or _available_cores()
+    workers = max(1, min(workers, len(jobs)))
+    rank = {job: i for i, job in enumerate(jobs)}
+    best = (None, None, None, None)
+    bound, stop_rank = ctypes.c_int(-1), ctypes.c_int(len(jobs))  # -1 = no bound yet; jobs ranked above stop_rank give up
+    deadline = state.get("deadline")
+    pruned = 0
+
+    def out_of_time():
+        return deadline is not None and best[1] is not None and time.time() >= deadline
+
+    def consider(result):
+        nonlocal best, pruned
+        order_idx, seed, triples, assignment, ms, report = result
+        if triples is None:
+            if report.get("stop") == "bound":
+                pruned += 1
+                print(f"   ✂️ order#{order_idx} seed={seed} pruned at triples={report['triples']} "
+                      f"after {report['colored']} courses ({_fmt_ms(ms)})", flush=True)
+            else:
+                print(f"   ❌ order#{order_idx} seed={seed} infeasible with this restart ({_fmt_ms(ms)})", flush=True)
+            return False
+        print(f"   ✅ order#{order_idx} seed={seed} pre-repair triples={triples} ({_fmt_ms(ms)})", flush=True)
+        if best[0] is None or (triples, rank[(order_idx, seed)]) < (best[0], rank[(best[2], best[3])]):
+            best = (triples, assignment, order_idx, seed)
+            bound.value = triples
+        return triples == 0
+
+    in_process = None
+    if workers == 1:
+        in_process = "one worker"
+    elif len(state["course_list"]) < PORTFOLIO_MIN_COURSES:
+        in_process = f"fewer than {PORTFOLIO_MIN_COURSES} courses"
+    elif not _POOL_LOCK.acquire(blocking=False):
+        in_process = "pool busy with another run"
+    owns_pool = in_process is None
+    try:
+        start = 0
+        if in_process is None and _POOL.get("workers") != workers:
+            # Cold pool: price the restarts with the first one before paying for the startup
+            result = _run_restart(state, bound, stop_rank, *jobs[0], day_limit, 0)
+            start = 1
+            if consider(result) or len(jobs) == 1:
+                print(f"🧵 [portfolio] done after 1 restart • pruned={pruned}", flush=True)
+                return best
+            sequential_ms = result[4] * (len(jobs) - 1)
+            saved_ms = sequential_ms - sequential_ms / workers
+            left_ms = float("inf") if deadline is None else (deadline - time.time()) * 1000
+            if saved_ms <= _POOL_STARTUP_MS or left_ms <= _POOL_STARTUP_MS:
+                in_process = (f"{workers} workers would save ≈ {_fmt_ms(saved_ms)} of ≈ {_fmt_ms(sequential_ms)}; "
+                              f"pool startup ≈ {_fmt_ms(_POOL_STARTUP_MS)}")
+
+        if in_process is not None:
+            print(f"🧵 [portfolio] {len(jobs)} restarts in-process ({in_process})", flush=True)
+            for i, (order_idx, seed) in enumerate(jobs[start:], start):
+                if out_of_time():
+                    print("🧵 [portfolio] deadline reached; skipping the remaining restarts", flush=True)
+                    break
+                if consider(_run_restart(state, bound, stop_rank, order_idx, seed, day_limit, i)):
+                    break
+            print(f"🧵 [portfolio] done • pruned={pruned}", flush=True)
+            return best
+
+        print(f"🧵 [portfolio] {len(jobs) - start} restarts on {workers} worker(s)", flush=True)
+        pool = _portfolio_pool(workers)
+        pool["bound"].value, pool["stop_rank"].value = bound.value, len(jobs)
+        bound, stop_rank = pool["bound"], pool["stop_rank"]
+        tmpdir = tempfile.mkdtemp(prefix="portfolio-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        futures = {}
+        try:
+            t_share = _now_ms()
+            shared = _share_state(state, tmpdir)
+            paths = [p for pair in shared["csr"].values() for p in pair] + list(shared["arrays"].values())
+            written = len(os.listdir(tmpdir))
+            print(f"🧵 [portfolio] state shared in {_fmt_ms(_now_ms() - t_share)} "
+                  f"({written} array(s) written, {len(paths) - written} memory-mapped from the snapshot)", flush=True)
+            futures = {pool["executor"].submit(_restart_job, shared, order_idx, seed, day_limit, i): i
+                       for i, (order_idx, seed) in enumerate(jobs) if i >= start}
+            stop_at = len(jobs)
+            pending = set(futures)
+            while pending:
+                timeout = None if deadline is None or best[1] is None else max(0.0, deadline - time.time())
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    cancelled = sum(f.cancel() for f in pending)
+                    print(f"🧵 [portfolio] deadline reached; cancelled {cancelled} pending restart(s)", flush=True)
+                    break
+                for fut in sorted(done, key=futures.get):
+                    if fut.cancelled() or futures[fut] > stop_at:
+                        continue
+                    if consider(fut.result()):
+                        # Later jobs can no longer win; earlier ones still can (ties go to the earliest job)
+                        stop_at = futures[fut]
+                        stop_rank.value = stop_at
+                        cancelled = sum(f.cancel() for f, i in futures.items() if i > stop_at and not f.done())
+                        print(f"🧵 [portfolio] zero-triple restart found; cancelled {cancelled} pending restart(s)", flush=True)
+                if stop_at < len(jobs) and all(f.done() for f, i in futures.items() if i < stop_at):
+                    break
+        finally:
+            t_stop = _now_ms()
+            stop_rank.value = -1  # every restart still running gives up
+            for fut in futures:
+                fut.cancel()
+            wait(futures)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            if any(not f.cancelled() and isinstance(f.exception(), BrokenProcessPool) for f in futures):
+                shutdown_portfolio_pool()  # a worker died; the next run starts a fresh pool
+        print(f"🧵 [portfolio] done • pruned={pruned}  • restarts stopped in {_fmt_ms(_now_ms() - t_stop)}", flush=True)
+        return best
+    finally:
+        if owns_pool:
+            _POOL_LOCK.release()
+
+
+# -------------------------
+# Day minimization: binary search + warm-started recoloring
+# -------------------------
+def _kempe_chain(starts, a, b, assignment, conflict_map):
+    """Courses reachable from `starts` through conflicts while staying on slots a/b."""
+    chain = set()
+    stack = list(starts)
+    while stack:
+        c = stack.pop()
+        if c in chain:
+            continue
+        chain.add(c)
+        for n in conflict_map.get(c, ()):
+            if n not in chain and assignment.get(n) in (a, b):
+                stack.append(n)
+    return chain
+
+
+def _recolor_removed_days(assignment, keep_slots, conflict_map, course_to_students, fixed_slot_assignment):
+    """
+    Warm start for a smaller day count: keep every course already on keep_slots and
+    re-place only the ones on the removed days. Each displaced course takes a free slot
+    (fewest new triples first); when none is free, a Kempe-chain interchange between
+    two kept slots frees one without breaking any conflict. Fixed courses never move.
+    Returns (assignment, kempe swaps) or (None, kempe swaps) when a course cannot be placed.
+    """
+    keep = set(keep_slots)
+    new_assign = {c: sl for c, sl in assignment.items() if sl in keep or c in fixed_slot_assignment}
+    displaced = [c for c in assignment if c not in new_assign]
+    displaced.sort(key=lambda c: len(conflict_map.get(c, ())), reverse=True)
+    occupancy = DayOccupancy.from_assignment(keep_slots, new_assign, course_to_students)
+    swaps = 0
+
+    for v in displaced:
+        enrolled = course_to_students.get(v, ())
+        blocked = {new_assign[n] for n in conflict_map.get(v, ()) if n in new_assign}
+        free = [s for s in keep_slots if s not in blocked]
+        if free:
+            slot = min(free, key=lambda s: sum(occupancy.would_create_triple(stu, s) for stu in enrolled))
+            new_assign[v] = slot
+            occupancy.add(enrolled, slot)
+            continue
+
+        # Kempe interchange: swap a/b on the chains through v's a-neighbors, if none reaches a b-neighbor
+        neighbors_on = defaultdict(list)
+        for n in conflict_map.get(v, ()):
+            if n in new_assign:
+                neighbors_on[new_assign[n]].append(n)
+        placed = False
+        for a in sorted(keep_slots, key=lambda s: len(neighbors_on[s])):
+            for b in keep_slots:
+                if b == a:
+                    continue
+                chain = _kempe_chain(neighbors_on[a], a, b, new_assign, conflict_map)
+                if any(n in chain for n in neighbors_on[b]) or any(c in fixed_slot_assignment for c in chain):
+                    continue
+                for c in chain:
+                    old = new_assign[c]
+                    new_assign[c] = b if old == a else a
+                    occupancy.move(course_to_students.get(c, ()), old, new_assign[c])
+                new_assign[v] = a
+                occupancy.add(enrolled, a)
+                swaps += 1
+                placed = True
+                break
+            if placed:
+                break
+        if not placed:
+            return None, swaps
+
+    return new_assign, swaps
+
+
+def minimize_days(state, assignment, triples, slot_order, seed, lo, hi, max_extra_triples=5, probe_share=0.2):
+    """
+    Fewest days in [lo, hi] (hi known to work with `assignment`), in two phases:
+      1. walk down from hi - 1, recoloring the best coloring into one day less
+         (_recolor_removed_days) for as long as that cheap warm start succeeds
+      2. binary search over what is left: each probe tries the warm start and falls
+         back to a fresh DSATUR/exact coloring, given probe_share of the stage time
+         left when the search began
+    A step is accepted when its pre-repair triples stay within max_extra_triples of the
+    current best. Past state["deadline"] (optional, time.time()) the search stops with
+    the best day count so far. Returns (days, assignment, triples).
+    """
+    course_to_students = state["course_to_students"]
+    deadline = state.get("deadline")
+    probe_seconds = None if deadline is None else probe_share * max(0.0, deadline - time.time())
+    best = (hi, assignment, triples)
+    timed_out = False
+
+    def out_of_time():
+        nonlocal timed_out
+        if not timed_out and deadline is not None and time.time() >= deadline:
+            print(f"🔎 [days] deadline reached; keeping {best[0]} days (search range {lo}..{best[0]})", flush=True)
+            timed_out = True
+        return timed_out
+
+    def warm(days):
+        day_slots = slot_order[:days]
+        candidate, swaps = _recolor_removed_days(best[1], day_slots, state["conflict_map"],
+                                                 course_to_students, state["fixed_slot_assignment"])
+        return candidate, None if candidate is None else _count_triples(candidate, day_slots, course_to_students), swaps
+
+    while lo < best[0] and not out_of_time():
+        t0 = _now_ms()
+        days = best[0] - 1
+        candidate, new_triples, swaps = warm(days)
+        if new_triples is None or new_triples > best[2] + max_extra_triples:
+            print(f"🔎 [days] warm recolor stops at {best[0]} days ({_fmt_ms(_now_ms() - t0)})", flush=True)
+            break
+        print(f"   ✅ {days} days work via warm recolor ({swaps} Kempe swaps); "
+              f"pre-repair triples={new_triples} ({_fmt_ms(_now_ms() - t0)})", flush=True)
+        best = (days, candidate, new_triples)
+
+    while lo < best[0] and not out_of_time():
+        mid = (lo + best[0]) // 2
+        t0 = _now_ms()
+        bound = best[2] + max_extra_triples
+        print(f"🔎 [days] trying {mid} days (search range {lo}..{best[0]})", flush=True)
+
+        candidate, new_triples, swaps = warm(mid)
+        how = f"warm recolor ({swaps} Kempe swaps)"
+        if new_triples is None or new_triples > bound:
+            probe_state = state if deadline is None else dict(state, deadline=min(deadline, time.time() + probe_seconds))
+            candidate = _color_restart(probe_state, mid, slot_order, seed, upper_bound=bound)
+            new_triples = None if candidate is None else _count_triples(candidate, slot_order[:mid], course_to_students)
+            how = "fresh coloring"
+
+        if new_triples is not None and new_triples <= bound:
+            print(f"   ✅ {mid} days work via {how}; pre-repair triples={new_triples} ({_fmt_ms(_now_ms() - t0)})", flush=True)
+            best = (mid, candidate, new_triples)
+        else:
+            print(f"   ❌ {mid} days not feasible (or too many triples) ({_fmt_ms(_now_ms() - t0)})", flush=True)
+            lo = mid + 1
+    return best
+
+
+# -------------------------
+# Run budget: one deadline, shared out stage by stage
+# -------------------------
+class TimeBudget:
+    """
+    One deadline for a whole scheduling run. Each stage takes a share of the time still
+    left, so whatever an early-finishing stage leaves unused flows to the later ones;
+    `reserve` seconds are held back for building and saving the result.
+    progress: optional callback(stage, elapsed_seconds, total_seconds, triples).
+    """
+
+    def __init__(self, seconds, reserve=0.0, progress=None):
+        self.t0 = time.time()
+        self.seconds = seconds
+        self.deadline = self.t0 + max(0.0, seconds - reserve)
+        self.progress = progress
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def share(self, fraction):
+        """Seconds for the next stage: `fraction` of what is left."""
+        return self.remaining() * fraction
+
+    def stage_deadline(self, fraction):
+        return time.time() + self.share(fraction)
+
+    def report(self, stage, triples=None):
+        elapsed = time.time() - self.t0
+        extra = "" if triples is None else f"  • triples={triples}"
+        print(f"⏱️ [budget] {stage}  • {elapsed:.1f}s of {self.seconds:.0f}s  • {self.remaining():.1f}s left{extra}", flush=True)
+        if self.progress is not None:
+            self.progress(stage, elapsed, self.seconds, triples)
+
+
 # -------------------------
 # MAIN: build schedule + repair + CP-SAT (order-aware) + expand + save
 # -------------------------
-def schedule_exams_from_db(xml_file_ids, start_date, num_days):
+def schedule_exams_from_db(xml_file_ids, start_date, num_days, use_snapshot=True,
+                           num_restarts=None, workers=None, time_budget_seconds=None, progress=None):
+    """
+    Anytime pipeline: restarts → fewest days → repair → tabu → CP-SAT LNS, all inside
+    one wall-clock budget (time_budget_seconds, default SCHEDULER_TIME_BUDGET) and one
+    CPU budget (workers, default SCHEDULER_WORKERS or every available core) used by both
+    the restart pool and CP-SAT. Each improvement stage only keeps better schedules, so
+    the best valid schedule so far is what gets saved when time runs out; the one
+    exception is the first coloring, which is awaited even past the deadline.
+    progress: optional callback(stage, elapsed_seconds, total_seconds, triples).
+    """
     t_all = _now_ms()
     print("🚀 [schedule_exams_from_db] START (AM-only, even indices + restarts + order-aware repair + CP-SAT)", flush=True)
+    seconds = SCHEDULER_TIME_BUDGET if time_budget_seconds is None else time_budget_seconds
+    budget = TimeBudget(seconds, reserve=min(10.0, 0.1 * seconds), progress=progress)
+    cores = workers or SCHEDULER_WORKERS or _available_cores()
+    print(f"  • Budget: {seconds:.0f}s wall clock on {cores} core(s)", flush=True)
 
     total_days = num_days
     print(f"  • num_days={num_days} total_days(AM-only)={total_days}", flush=True)
 
-    course_to_students, student_to_courses, course_map = get_student_course_mappings(xml_file_ids)
-    print(f"  • After mapping: courses={len(course_to_students)} students={len(student_to_courses)}", flush=True)
-
-    course_to_students, student_to_courses, group_map, course_to_group = apply_merged_course_mapping(course_to_students, student_to_courses)
-    print(f"  • After merge: merged_courses={len(course_to_students)}", flush=True)
+    # The only enrollment read of the run (or a snapshot hit); the raw enrollment and names are kept for the final rows
+    snapshot, group_map, _ = prepare_enrollment(xml_file_ids, use_snapshot=use_snapshot)
+    raw_enrollment, course_map, student_names = snapshot.raw_enrollment, snapshot.course_map, snapshot.student_names
+    enrollment = snapshot.enrollment
+    print(f"  • After mapping: courses={raw_enrollment.num_courses} students={raw_enrollment.num_students}", flush=True)
+    print(f"  • After merge: merged_courses={enrollment.num_courses}", flush=True)
+    budget.report("enrollment loaded")
 
-    conflict_map = build_conflict_map(student_to_courses)
+    # From here on courses and students are dense integer ids of `enrollment`
+    course_to_students = enrollment.course_members()
+    student_to_courses = enrollment.student_members()
+    conflict_graph = snapshot.conflict_graph
+    conflict_map = conflict_graph.as_mapping()
 
     # ---------------------------
     # Blended ordering
     # ---------------------------
-    degrees = {c: len(conflict_map.get(c, set())) for c in course_to_students.keys()}
-    enrollments = {c: len(stus) for c, stus in course_to_students.items()}
+    degrees = conflict_graph.degrees
+    weighted_degrees = conflict_graph.weighted_degrees
+    enrollments = enrollment.course_sizes
 
     def blended_score(c):
-        return 0.6 * enrollments.get(c, 0) + 0.4 * degrees.get(c, 0)
+        return 0.6 * enrollments[c] + 0.4 * degrees[c]
 
-    sorted_courses = sorted(course_to_students.keys(), key=lambda c: blended_score(c), reverse=True)
+    sorted_courses = sorted(range(enrollment.num_courses), key=lambda c: blended_score(c), reverse=True)
     course_list = list(sorted_courses)
     print(f"  • Target list size: {len(course_list)}", flush=True)
 
     # Fixed slots
     fixed_slot_assignment = {}
-    fixed_courses_set = set()
     for course_code, slot in FIXED_COURSE_SLOTS.items():
-        fixed_slot_assignment[course_code] = slot
-        fixed_courses_set.add(course_code)
+        c = enrollment.course_index.get(course_code)
+        if c is None:
+            print(f"  ⚠️ Fixed course {course_code} has no enrollment in this run; ignoring", flush=True)
+            continue
+        fixed_slot_assignment[c] = slot
     if fixed_slot_assignment:
         print(f"  • Fixed slots preset: {fixed_slot_assignment}", flush=True)
 
@@ -969,84 +2052,55 @@ def schedule_exams_from_db(xml_file_ids, start_date, num_days):
 
     print("  • Trying slot orders:", slot_orders, flush=True)
 
-    max_deg = max(degrees.values()) if degrees else 0
-    lower_bound = min(total_days, max_deg + 1)
-    print(f"  • Degree stats: max_degree={max_deg}  → lower_bound_days={lower_bound}", flush=True)
-
-    def try_with_days_and_order(day_limit: int, pref_slots: list, seed: int):
-        slots = pref_slots[:day_limit]
-        ds = _dsatur_color(
-            course_list,
-            conflict_map,
-            max_colors=day_limit,
-            preferred_slots=slots,
-            fixed_slot_assignment=fixed_slot_assignment,
-            course_to_students=course_to_students,
-            seed=seed
-        )
-        if ds is not None:
-            return ds
-        return backtrack_schedule(
-            [c for c in course_list if c not in fixed_courses_set],
-            conflict_map, slots, fixed_slot_assignment,
-            max_ms_per_attempt=10000, max_calls_per_attempt=2_000_000
-        )
-
-    def pre_repair_triple_count(assign_map, day_slots):
-        student_slots, _ = _compute_student_slots_map(assign_map, student_to_courses)
-        return len(_detect_violations_order_aware(student_slots, day_slots))
-
-    best_assignment = None
-    best_order = None
-    best_seed = None
-    best_triples = None
-
-    for order_idx, pref in enumerate(slot_orders):
-        for seed in range(5):
-            print(f"🔎 Restart: order#{order_idx} seed={seed}", flush=True)
-            candidate = try_with_days_and_order(total_days, pref, seed)
-            if candidate is None:
-                print("   ❌ infeasible with this restart", flush=True)
-                continue
-            triples = pre_repair_triple_count(candidate, pref[:total_days])
-            print(f"   ✅ pre-repair triples={triples}", flush=True)
-            if best_triples is None or triples < best_triples:
-                best_triples = triples
-                best_assignment = candidate
-                best_order = order_idx
-                best_seed = seed
-                if best_triples == 0:
-                    break
-        if best_triples == 0:
-            break
+    # max_degree + 1 days always suffice (an upper bound); a clique needs one day per course (a lower bound)
+    max_deg = int(degrees.max()) if len(degrees) else 0
+    min_days, clique, _ = clique_lower_bound(conflict_graph, time_limit_seconds=min(5.0, budget.share(0.05)))
+    min_days = max(1, min_days)  # no conflicts gives a 0 bound, but the day search starts at one day
+    print(f"  • Degree stats: max_degree={max_deg} (≤ {max_deg + 1} days suffice)  • clique lower bound: ≥ {min_days} days", flush=True)
+    if min_days > total_days:
+        sample = ", ".join(str(enrollment.course_keys[c]) for c in clique[:5])
+        raise Exception(f"❌ {min_days} courses pairwise share students (e.g. {sample}); "
+                        f"they cannot fit in {total_days} AM days.")
+
+    # Read-only solver state shared with the restart workers
+    restart_state = {
+        "course_list": course_list,
+        "conflict_map": conflict_map,
+        "course_to_students": course_to_students,
+        "weighted_degrees": weighted_degrees,
+        "fixed_slot_assignment": fixed_slot_assignment,
+        "slot_orders": slot_orders,
+        "deadline": budget.stage_deadline(0.3),
+    }
+
+    # Seed-major so that a small restart budget still covers every slot order
+    num_restarts = SCHEDULER_RESTARTS if num_restarts is None else num_restarts
+    seeds_per_order = -(-num_restarts // len(slot_orders))
+    jobs = [(order_idx, seed) for seed in range(seeds_per_order)
+            for order_idx in range(len(slot_orders))][:max(1, num_restarts)]
+    best_triples, best_assignment, best_order, best_seed = run_restart_portfolio(
+        restart_state, jobs, total_days, workers=cores
+    )
 
     if best_assignment is None:
         print("❌ Could not fit within requested days.", flush=True)
         raise Exception("❌ Could not find a valid AM-only schedule within available days.")
 
-    course_slot_map = best_assignment
     chosen_order = slot_orders[best_order]
-    day_slots = chosen_order[:total_days]
     print(f"🏁 Pre-repair best restart: order#{best_order} seed={best_seed}  • pre-repair triples={best_triples}", flush=True)
+    budget.report("restarts", best_triples)
 
-    # Shrink days cautiously
-    best_days = total_days
-    for day_limit in range(total_days - 1, 0, -1):
-        print(f"🔎 Trying to shrink to {day_limit} days…", flush=True)
-        candidate = try_with_days_and_order(day_limit, chosen_order, best_seed)
-        if candidate is not None:
-            new_triples = pre_repair_triple_count(candidate, chosen_order[:day_limit])
-            if new_triples <= best_triples + 5:
-                course_slot_map = candidate
-                best_days = day_limit
-                best_triples = new_triples
-                day_slots = chosen_order[:best_days]
-                print(f"   ✅ Works with {day_limit} days; pre-repair triples={new_triples}. Continuing…", flush=True)
-                continue
-        print(f"   ❌ {day_limit} days not feasible (or too many triples); keeping {best_days}.", flush=True)
-        break
+    # Fewest days: binary search down to the clique bound, warm-starting from the best coloring
+    restart_state["deadline"] = budget.stage_deadline(0.3)
+    best_days, course_slot_map, best_triples = minimize_days(
+        restart_state, best_assignment, best_triples, chosen_order, best_seed, min_days, total_days
+    )
+    day_slots = chosen_order[:best_days]
 
+    if best_days == min_days:
+        print(f"🏁 Reached the clique lower bound; {best_days} days is the minimum.", flush=True)
     print(f"🏁 Pre-repair days used: {best_days}", flush=True)
+    budget.report(f"days ({best_days})", best_triples)
 
     # Order-aware repair
     course_slot_map, remaining = repair_3_in_3(
@@ -1057,75 +2111,46 @@ def schedule_exams_from_db(xml_file_ids, start_date, num_days):
         preferred_slots=day_slots,
         max_passes=10,
         max_moves=2000,
-        enable_swaps=True
+        enable_swaps=True,
+        time_limit_seconds=budget.share(0.25),
+        weighted_degrees=weighted_degrees
     )
+    budget.report("repair", remaining)
 
-    # CP-SAT finisher (never worsen due to bound)
-    if remaining > 0:
-        print(f"⚠️ After repair, {remaining} 3-in-3 cases remain. Triggering CP-SAT finisher…", flush=True)
-        current_assign = dict(course_slot_map)  # merged-key space
-        improved = optimize_triples_cp_sat(
-            course_list=list(course_to_students.keys()),
-            conflict_map=conflict_map,
-            student_to_courses=student_to_courses,
-            fixed_slot_assignment=FIXED_COURSE_SLOTS,
-            current_assignment=current_assign,
-            day_slots=day_slots,
-            current_best_triples=remaining,        # 🔒 never worse
-            time_limit_seconds=60.0,               # a bit more time
-            workers=8
+    # Tabu search on what repair could not fix (sideways/uphill moves allowed)
+    if remaining > 0 and budget.remaining() > 0:
+        course_slot_map, remaining = tabu_search_triples(
+            course_slot_map, course_to_students, student_to_courses, conflict_map, day_slots,
+            fixed_slot_assignment=fixed_slot_assignment, time_limit_seconds=budget.share(0.4), seed=best_seed
         )
-        # Evaluate improved with the same order-aware metric
-        student_slots_tmp, _ = _compute_student_slots_map(improved, student_to_courses)
-        improved_remaining = len(_detect_violations_order_aware(student_slots_tmp, day_slots))
-        print(f"🧩 [cp-sat] result triples={improved_remaining}", flush=True)
-        if improved_remaining <= remaining:
-            course_slot_map = improved
-            remaining = improved_remaining
-        else:
-            print("🧩 [cp-sat] did not improve; keeping heuristic assignment.", flush=True)
+        budget.report("tabu", remaining)
+
+    # CP-SAT finisher: LNS over small neighborhoods of the remaining triples (never worsens)
+    if remaining > 0 and budget.remaining() > 0:
+        print(f"⚠️ After repair and tabu search, {remaining} 3-in-3 cases remain. Triggering CP-SAT LNS finisher…", flush=True)
+        course_slot_map, remaining = lns_triples_cp_sat(
+            course_slot_map, course_to_students, student_to_courses, conflict_map, day_slots,
+            fixed_slot_assignment=fixed_slot_assignment, time_limit_seconds=budget.remaining(),
+            workers=cores, seed=best_seed
+        )
+        budget.report("cp-sat lns", remaining)
 
-    # Expand grouped codes back to individual courses
+    # Back from dense ids to merged keys, then expand grouped codes to individual courses
+    course_slot_map = {enrollment.course_keys[c]: slot for c, slot in course_slot_map.items()}
     course_slot_map = expand_grouped_course_slots(course_slot_map, group_map, course_map)
 
-    # Rebuild student mappings with names
-    course_to_students_named = rebuild_course_to_students_with_names(course_to_students, course_map, course_to_group)
-
-    db = SessionLocal()
-    student_names = {s.student_id1: s.name for s in db.query(Student).all()}
-    db.close()
-    print(f"  • Student names fetched: {len(student_names)}", flush=True)
-
-    print("🧾 Building final dataframe…", flush=True)
-    rows = []
-    missing_slots = 0
-    for course, students in course_to_students_named.items():
-        slot = course_slot_map.get(course, None)
-        if slot is None:
-            missing_slots += 1
-        day, time_label = get_day_and_time(slot, start_date) if slot is not None else ("Unscheduled", "")
-        course_code, course_name = course
-        for student in students:
-            rows.append({
-                "Student ID": student,
-                "Student Name": student_names.get(student, "Unknown"),
-                "Course Code": course_code,
-                "Course Name": course_name,
-                "Day": day,
-                "Time": time_label,
-                "Slot #": slot if slot is not None else "N/A"
-            })
-
-    if missing_slots:
-        print(f"  ⚠️ Courses without slots after expansion: {missing_slots}", flush=True)
+    # Rebuild student mappings with names (in memory, from the first load)
+    named_enrollment = rebuild_course_to_students_with_names(raw_enrollment, course_map)
+    final_schedule_df = build_schedule_frame(named_enrollment, course_slot_map, student_names, start_date)
 
     # Persist
     try:
+        rows = final_schedule_df.to_dict("records")
         run_id = save_schedule_to_db(course_slot_map, rows, start_date, best_days, xml_file_ids)
         print(f"🗂️ Schedule saved with run_id={run_id}", flush=True)
     except Exception as e:
         print(f"⚠️ Schedule persistence failed, continuing to return DataFrame. Error: {e}", flush=True)
 
-    final_schedule_df = pd.DataFrame(rows)
+    budget.report("saved", remaining)
     print(f"✅ [schedule_exams_from_db] DONE (order-aware pipeline) in {_fmt_ms(_now_ms() - t_all)}  • rows={len(final_schedule_df)}", flush=True)
-    return final_schedule_df, student_to_courses, course_to_students_named
+    return final_schedule_df, enrollment.student_key_mapping(), named_enrollment.course_key_mapping()
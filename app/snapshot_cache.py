@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+from app.enrollment import Enrollment
+from app.conflict_graph import ConflictGraph
+
+# Local, per-machine cache of interned enrollment snapshots (one directory per xml_file_ids set)
+SNAPSHOT_DIR = os.getenv(
+    "ENROLLMENT_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "enrollment"),
+)
+# LRU eviction: keep at most this many snapshots / this many bytes on disk
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("ENROLLMENT_SNAPSHOT_MAX_ENTRIES", "8"))
+SNAPSHOT_MAX_BYTES = int(os.getenv("ENROLLMENT_SNAPSHOT_MAX_MB", "1024")) * 1024 * 1024
+
+_FORMAT_VERSION = 3
+
+
+class EnrollmentSnapshot:
+    """
+    Everything the scheduler derives from the database before solving:
+    the raw enrollment, course_map / student names for the final rows, the merged
+    enrollment, and the merged (weighted) conflict graph.
+    """
+
+    def __init__(self, raw_enrollment, course_map, student_names, enrollment, conflict_graph):
+        self.raw_enrollment = raw_enrollment
+        self.course_map = course_map
+        self.student_names = student_names
+        self.enrollment = enrollment
+        self.conflict_graph = conflict_graph
+
+
+def snapshot_key(xml_file_ids):
+    ids = ",".join(str(i) for i in sorted(xml_file_ids))
+    return hashlib.sha1(ids.encode()).hexdigest()[:16]
+
+
+def _entry_dir(xml_file_ids):
+    return os.path.join(SNAPSHOT_DIR, snapshot_key(xml_file_ids))
+
+
+def _str_columns(name, values):
+    """
+    A string column as fixed-width unicode (memory-mappable like the int arrays),
+    plus a `{name}_null` mask when some values are None so a load restores them.
+    """
+    values = list(values)
+    out = {name: np.array(["" if v is None else str(v) for v in values], dtype=str) if values else np.array([], dtype="U1")}
+    if any(v is None for v in values):
+        out[f"{name}_null"] = np.array([v is None for v in values], dtype=bool)
+    return out
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def load_snapshot(xml_file_ids, fingerprint):
+    """
+    Memory-map the snapshot for xml_file_ids. Returns None on a miss; a snapshot
+    whose fingerprint no longer matches the database is deleted (invalidated).
+    A missing or unreadable file (corrupt entry, or one being replaced or evicted by
+    another process right now) is also a miss, so the caller falls back to the database.
+    """
+    path = _entry_dir(xml_file_ids)
+    try:
+        return _load_entry(path, fingerprint)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ [snapshot] unreadable entry {os.path.basename(path)} ({e}); loading from the database", flush=True)
+        return None
+
+
+def _load_entry(path, fingerprint):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("fingerprint") != fingerprint or meta.get("version") != _FORMAT_VERSION:
+        print("🗑️ [snapshot] stale fingerprint; invalidating", flush=True)
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    def arr(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    def strings(name):
+        values = arr(name).tolist()
+        if os.path.exists(os.path.join(path, f"{name}_null.npy")):
+            values = [None if null else v for v, null in zip(values, arr(f"{name}_null").tolist())]
+        return values
+
+    raw = Enrollment(
+        list(zip(strings("raw_course_code"), strings("raw_course_name"))),
+        strings("raw_student_keys"),
+        arr("raw_course_ptr"), arr("raw_course_students"),
+        arr("raw_student_ptr"), arr("raw_student_courses"),
+    )
+    merged = Enrollment(
+        strings("merged_course_keys"),
+        raw.student_keys,
+        arr("merged_course_ptr"), arr("merged_course_students"),
+        arr("merged_student_ptr"), arr("merged_student_courses"),
+    )
+    course_map = dict(zip(arr("course_map_ids").tolist(),
+                          zip(strings("course_map_code"), strings("course_map_name"))))
+    student_names = dict(zip(raw.student_keys, strings("raw_student_names")))
+
+    os.utime(path)  # LRU touch
+    conflict_graph = ConflictGraph(arr("conflict_ptr"), arr("conflict_neighbors"), arr("conflict_weights"))
+    return EnrollmentSnapshot(raw, course_map, student_names, merged, conflict_graph)
+
+
+def save_snapshot(xml_file_ids, fingerprint, snapshot):
+    """Write the snapshot atomically (temp dir + rename), then apply the eviction policy."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _entry_dir(xml_file_ids)
+    tmp = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    raw, merged = snapshot.raw_enrollment, snapshot.enrollment
+    arrays = {
+        "course_map_ids": np.array(list(snapshot.course_map.keys()), dtype=np.int64),
+        "conflict_ptr": snapshot.conflict_graph.ptr,
+        "conflict_neighbors": snapshot.conflict_graph.neighbors,
+        "conflict_weights": snapshot.conflict_graph.weights,
+    }
+    arrays.update(_str_columns("raw_course_code", [k[0] for k in raw.course_keys]))
+    arrays.update(_str_columns("raw_course_name", [k[1] for k in raw.course_keys]))
+    arrays.update(_str_columns("raw_student_keys", raw.student_keys))
+    arrays.update(_str_columns("raw_student_names", [snapshot.student_names.get(s) for s in raw.student_keys]))
+    arrays.update(_str_columns("merged_course_keys", merged.course_keys))
+    arrays.update(_str_columns("course_map_code", [v[0] for v in snapshot.course_map.values()]))
+    arrays.update(_str_columns("course_map_name", [v[1] for v in snapshot.course_map.values()]))
+    arrays.update({f"raw_{k}": v for k, v in raw.to_arrays().items()})
+    arrays.update({f"merged_{k}": v for k, v in merged.to_arrays().items()})
+
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(values))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            "version": _FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "xml_file_ids": sorted(xml_file_ids),
+            "created_at": time.time(),
+        }, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Another process put its own copy in place between the rmtree and here; keep that one
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    print(f"💾 [snapshot] saved {snapshot_key(xml_file_ids)}  • {_dir_size(path) / 1e6:.1f}MB", flush=True)
+    evict_snapshots()
+
+
+def evict_snapshots(max_entries=None, max_bytes=None):
+    """Drop least-recently-used snapshots until both the entry and byte caps hold."""
+    max_entries = SNAPSHOT_MAX_ENTRIES if max_entries is None else max_entries
+    max_bytes = SNAPSHOT_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+
+    entries = []
+    for name in os.listdir(SNAPSHOT_DIR):
+        path = os.path.join(SNAPSHOT_DIR, name)
+        if os.path.isdir(path) and ".tmp" not in name:
+            try:
+                entries.append((os.path.getmtime(path), _dir_size(path), path))
+            except OSError:
+                continue  # removed by another process meanwhile
+    entries.sort(reverse=True)  # most recently used first
+
+    total = 0
+    for i, (_, size, path) in enumerate(entries):
+        total += size
+        if i >= max_entries or (i > 0 and total > max_bytes):
+            print(f"🧹 [snapshot] evicting {os.path.basename(path)}", flush=True)
+            shutil.rmtree(path, ignore_errors=True)
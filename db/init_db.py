@@ -1,8 +1,13 @@
+from sqlalchemy import text
 from db.session import engine
 from db.models import Base
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # Columns added after the first release; create_all does not alter existing tables
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE xml_files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_xml_files_content_hash ON xml_files (content_hash)"))
     print("✅ Tables created successfully.")
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ class XMLFile(Base):
     id = Column(Integer, primary_key=True)
     filename = Column(Text)
     gender_group = Column(String)
+    content_hash = Column(String(64), index=True)  # set once ingestion has committed
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
     courses = relationship("Course", back_populates="xml_file")
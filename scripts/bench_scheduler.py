@@ -0,0 +1,362 @@
+"""
+Synthetic benchmarks for the scheduler's data structures.
+
+    python -m scripts.bench_scheduler enrollment --courses 3000 --students 60000
+    python -m scripts.bench_scheduler conflict --courses 3000 --students 60000
+    python -m scripts.bench_scheduler bitset --courses 3000 --students 60000
+    python -m scripts.bench_scheduler coloring --courses 3000 --students 60000 --time-limit 20
+    python -m scripts.bench_scheduler cpsat --courses 200 --students 4000 --time-limit 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+# app.scheduler builds its (lazy, never connected) engine at import; solver benches need no database
+for _name, _value in (("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_NAME", "exams"),
+                      ("DB_USER", "bench"), ("DB_PASSWORD", "bench")):
+    os.environ.setdefault(_name, _value)
+
+from app.enrollment import Enrollment
+from app.conflict_graph import build_conflict_graph
+
+
+def synthetic_enrollment(num_courses, num_students, per_student=5, block=40, seed=0):
+    """Students take most courses inside one 'major' block plus the odd elective."""
+    rnd = random.Random(seed)
+    num_blocks = max(1, num_courses // block)
+    course_to_students = defaultdict(set)
+    for s in range(num_students):
+        student = f"4{s:08d}"
+        b = rnd.randrange(num_blocks)
+        pool = range(b * block, min(num_courses, (b + 1) * block))
+        courses = set(rnd.sample(pool, min(per_student, len(pool))))
+        if rnd.random() < 0.2:
+            courses.add(rnd.randrange(num_courses))
+        for c in courses:
+            course_to_students[(f"C{c:05d}", f"Course {c}")].add(student)
+    return course_to_students
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained, peak
+
+
+def bench_enrollment(args):
+    source = synthetic_enrollment(args.courses, args.students, seed=args.seed)
+    pairs = [(c, s) for c, students in source.items() for s in students]
+    print(f"courses={len(source)} memberships={len(pairs)}")
+
+    def build_dicts():
+        course_to_students = defaultdict(set)
+        student_to_courses = defaultdict(set)
+        for c, s in pairs:
+            course_to_students[c].add(s)
+            student_to_courses[s].add(c)
+        return course_to_students, student_to_courses
+
+    def build_csr():
+        course_index, student_index = {}, {}
+        pc = [course_index.setdefault(c, len(course_index)) for c, _ in pairs]
+        ps = [student_index.setdefault(s, len(student_index)) for _, s in pairs]
+        return Enrollment.from_pairs(list(course_index), list(student_index), pc, ps)
+
+    (_, s2c), t_dict, mem_dict, peak_dict = _measure(build_dicts)
+    enrollment, t_csr, mem_csr, peak_csr = _measure(build_csr)
+
+    # Conflict-graph sizing: co-enrolled course pairs per student
+    t0 = time.perf_counter()
+    total = sum(len(courses) * (len(courses) - 1) // 2 for courses in s2c.values())
+    t_walk_dict = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    loads = enrollment.student_loads.astype("int64")
+    total_csr = int((loads * (loads - 1) // 2).sum())
+    t_walk_csr = time.perf_counter() - t0
+    assert total == total_csr
+
+    print(f"{'':18}{'dict-of-sets':>16}{'CSR':>16}")
+    print(f"{'build time':18}{t_dict:>15.3f}s{t_csr:>15.3f}s")
+    print(f"{'retained memory':18}{mem_dict / 1e6:>14.1f}MB{mem_csr / 1e6:>14.1f}MB")
+    print(f"{'peak memory':18}{peak_dict / 1e6:>14.1f}MB{peak_csr / 1e6:>14.1f}MB")
+    print(f"{'CSR arrays only':18}{'':>16}{enrollment.nbytes() / 1e6:>14.1f}MB")
+    print(f"{'pair count':18}{t_walk_dict:>15.4f}s{t_walk_csr:>15.4f}s")
+
+
+def bench_conflict(args):
+    enrollment = Enrollment.from_mapping(synthetic_enrollment(args.courses, args.students, seed=args.seed))
+    student_to_courses = enrollment.student_members()
+
+    # The old build_conflict_map double loop
+    t0 = time.perf_counter()
+    conflict_map = defaultdict(set)
+    for courses in student_to_courses.values():
+        for i in range(len(courses)):
+            for j in range(i + 1, len(courses)):
+                conflict_map[courses[i]].add(courses[j])
+                conflict_map[courses[j]].add(courses[i])
+    t_loop = time.perf_counter() - t0
+
+    build_conflict_graph(enrollment)  # warm up the sparse import
+    t0 = time.perf_counter()
+    graph = build_conflict_graph(enrollment)
+    t_sparse = time.perf_counter() - t0
+
+    assert all(set(graph.neighbors_of(c).tolist()) == conflict_map.get(c, set()) for c in range(graph.num_courses))
+    print(f"courses={graph.num_courses} edges={graph.num_edges}")
+    print(f"python double loop (adjacency only): {t_loop:.3f}s")
+    print(f"sparse Aᵀ·A (adjacency + weights):   {t_sparse:.3f}s")
+
+
+def _pack_rows(ptr, neighbors, width, block=1024):
+    """CSR rows -> one int bitset per row, packed a block of rows at a time with np.packbits."""
+    num_rows = len(ptr) - 1
+    bits = []
+    for start in range(0, num_rows, block):
+        stop = min(num_rows, start + block)
+        dense = np.zeros((stop - start, max(width, 1)), dtype=bool)
+        rows = np.repeat(np.arange(stop - start), np.diff(ptr[start:stop + 1]))
+        dense[rows, neighbors[ptr[start]:ptr[stop]]] = True
+        packed = np.packbits(dense, axis=1, bitorder="little")
+        bits.extend(int.from_bytes(row.tobytes(), "little") for row in packed)
+    return bits
+
+
+def bench_bitset(args):
+    """
+    Saturation counts as DSATUR keeps them (forbidden-slot masks + popcount) vs a set of
+    neighbour slots. The slot-validity rows compare a neighbour walk with an AND against
+    per-slot course bitsets; the solvers no longer use whole-graph bitsets, so those
+    rows are a reference measurement only.
+    """
+    enrollment = Enrollment.from_mapping(synthetic_enrollment(args.courses, args.students, seed=args.seed))
+    graph = build_conflict_graph(enrollment)
+    conflict_map = {c: graph.neighbors_of(c).tolist() for c in range(graph.num_courses)}
+    rnd = random.Random(args.seed)
+    num_slots = 24
+    assignment = {c: 2 * rnd.randrange(num_slots) for c in range(graph.num_courses) if rnd.random() < 0.5}
+    probes = [(rnd.randrange(graph.num_courses), 2 * rnd.randrange(num_slots)) for _ in range(200_000)]
+
+    t0 = time.perf_counter()
+    bits = _pack_rows(graph.ptr, graph.neighbors, graph.num_courses)
+    t_build = time.perf_counter() - t0
+    slot_members = defaultdict(int)
+    for c, sl in assignment.items():
+        slot_members[sl] |= 1 << c
+
+    t0 = time.perf_counter()
+    walk = [all(assignment.get(n) != sl for n in conflict_map[c]) for c, sl in probes]
+    t_walk = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    masked = [not (bits[c] & slot_members[sl]) for c, sl in probes]
+    t_mask = time.perf_counter() - t0
+    assert walk == masked
+
+    courses = range(graph.num_courses)
+    t0 = time.perf_counter()
+    sat_sets = [len({assignment[n] for n in conflict_map[c] if n in assignment}) for c in courses]
+    t_sat_set = time.perf_counter() - t0
+    forbidden = [0] * graph.num_courses
+    for c, sl in assignment.items():
+        for n in conflict_map[c]:
+            forbidden[n] |= 1 << (sl // 2)
+    t0 = time.perf_counter()
+    sat_bits = [forbidden[c].bit_count() for c in courses]
+    t_sat_bits = time.perf_counter() - t0
+    assert sat_sets == sat_bits
+
+    print(f"courses={graph.num_courses} edges={graph.num_edges} slots={num_slots} probes={len(probes)}")
+    print(f"bitset build:                  {t_build:.3f}s")
+    print(f"is_valid  neighbour walk:      {t_walk:.3f}s")
+    print(f"is_valid  AND with slot mask:  {t_mask:.3f}s")
+    print(f"saturation set of slots:       {t_sat_set:.3f}s")
+    print(f"saturation popcount:           {t_sat_bits:.3f}s")
+
+
+def _dsatur_sets(course_list, conflict_map, preferred_slots, course_to_students, seed=0, weighted_degrees=None):
+    """
+    The DSATUR the solvers used before the bitset/heap rewrite: neighbour slots as sets,
+    a linear max scan for the next course, per-student day sets for the triple check.
+    """
+    rnd = random.Random(seed)
+    slot_to_day = {s: d for d, s in enumerate(preferred_slots)}
+    assignment = {}
+    uncolored = list(course_list)
+    rand_rank = {c: rnd.random() for c in uncolored}
+    wdeg = {c: (int(weighted_degrees[c]) if weighted_degrees is not None else 0) for c in uncolored}
+    degrees = {c: len(conflict_map[c]) for c in uncolored}
+    neighbor_slots = {c: set() for c in uncolored}
+    student_days = defaultdict(set)
+
+    def creates_triple(days, d):
+        return any({d + k, d + k + 1, d + k + 2} <= days | {d} for k in (-2, -1, 0))
+
+    while uncolored:
+        v = max(uncolored, key=lambda x: (len(neighbor_slots[x]), degrees[x], wdeg[x], rand_rank[x]))
+        free = [sl for sl in preferred_slots if sl not in neighbor_slots[v]]
+        if not free:
+            return None
+        enrolled = course_to_students[v]
+        chosen = next((sl for sl in free
+                       if not any(creates_triple(student_days[stu], slot_to_day[sl]) for stu in enrolled)), free[0])
+        assignment[v] = chosen
+        uncolored.remove(v)
+        for n in conflict_map[v]:
+            if n in neighbor_slots:
+                neighbor_slots[n].add(chosen)
+        for stu in enrolled:
+            student_days[stu].add(slot_to_day[chosen])
+    return assignment
+
+
+def _backtrack_sets(course_list, conflict_map, slot_list, max_seconds):
+    """The recursive chronological backtracking (static degree order, neighbour-walk validity) it replaced."""
+    assignment = {}
+    order = sorted(course_list, key=lambda c: len(conflict_map[c]), reverse=True)
+    deadline = time.perf_counter() + max_seconds
+    calls = 0
+
+    def backtrack(index):
+        nonlocal calls
+        calls += 1
+        if index == len(order):
+            return True
+        if time.perf_counter() > deadline:
+            return False
+        course = order[index]
+        for slot in slot_list:
+            if all(assignment.get(n) != slot for n in conflict_map[course]):
+                assignment[course] = slot
+                if backtrack(index + 1):
+                    return True
+                del assignment[course]
+        return False
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 2 * len(order) + 100))
+    try:
+        found = backtrack(0)
+    finally:
+        sys.setrecursionlimit(limit)
+    return (assignment if found else None), calls
+
+
+def bench_coloring(args):
+    """
+    DSATUR and the exact colorer as the scheduler runs them (slot bitmasks, lazy heap,
+    iterative FC-CBJ) against the set-based versions they replaced, on the same graph.
+    The exact colorers get the clique lower bound and the next two day counts, where
+    DSATUR alone would need more days and the fallback has to search.
+    """
+    from app.clique_bound import clique_lower_bound
+    from app.scheduler import _dsatur_color, backtrack_schedule
+
+    enrollment = Enrollment.from_mapping(synthetic_enrollment(args.courses, args.students, seed=args.seed))
+    graph = build_conflict_graph(enrollment)
+    conflict_map = {c: graph.neighbors_of(c).tolist() for c in range(graph.num_courses)}
+    course_to_students = {c: enrollment.students_of(c).tolist() for c in range(graph.num_courses)}
+    course_list = list(range(graph.num_courses))
+    weighted = graph.weighted_degrees
+    slots = [2 * d for d in range(int(graph.degrees.max()) + 1)]
+
+    t0 = time.perf_counter()
+    reference = _dsatur_sets(course_list, conflict_map, slots, course_to_students, args.seed, weighted)
+    t_ref = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    current = _dsatur_color(course_list, conflict_map, len(slots), slots, {}, course_to_students,
+                            seed=args.seed, weighted_degrees=weighted, verbose=False)
+    t_cur = time.perf_counter() - t0
+    used = len(set(current.values()))
+    with contextlib.redirect_stdout(io.StringIO()):
+        clique = clique_lower_bound(graph)[0]
+
+    print(f"courses={graph.num_courses} edges={graph.num_edges} max_degree={len(slots) - 1} "
+          f"clique bound={clique} dsatur days={used}")
+    print(f"{'':28}{'set-based':>12}{'current':>12}")
+    print(f"{'dsatur':28}{t_ref:>11.3f}s{t_cur:>11.3f}s   same coloring: {reference == current}")
+    for days in range(clique, min(clique + 3, used + 1)):
+        day_slots = slots[:days]
+        t0 = time.perf_counter()
+        ref_result, ref_calls = _backtrack_sets(course_list, conflict_map, day_slots, args.time_limit)
+        t_ref = time.perf_counter() - t0
+        report = {}
+        t0 = time.perf_counter()
+        backtrack_schedule(course_list, conflict_map, day_slots, {}, max_ms_per_attempt=int(args.time_limit * 1000),
+                           max_calls_per_attempt=10 ** 9, report=report, verbose=False)
+        t_cur = time.perf_counter() - t0
+        ref_stop = "complete" if ref_result is not None else "time"
+        print(f"{f'exact, {days} days':28}{t_ref:>11.3f}s{t_cur:>11.3f}s   "
+              f"set-based: {ref_stop} ({ref_calls} calls)  current: {report['stop']} ({report['calls']} calls)")
+
+
+def bench_cpsat(args):
+    """CP-SAT finisher conflict encodings: pairwise constraints vs clique at-most-one vs AllDifferent."""
+    from ortools.sat.python import cp_model
+    from app.clique_bound import clique_lower_bound
+    from app.scheduler import (CP_SAT_CONFLICT_ENCODINGS, _build_triples_model, _count_triples,
+                               _dsatur_color, optimize_triples_cp_sat)
+
+    enrollment = Enrollment.from_mapping(synthetic_enrollment(args.courses, args.students, seed=args.seed))
+    graph = build_conflict_graph(enrollment)
+    conflict_map = graph.as_mapping()
+    course_to_students = enrollment.course_members()
+    student_to_courses = enrollment.student_members()
+    course_list = list(range(graph.num_courses))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        num_days = args.days or clique_lower_bound(graph)[0] + 2
+        day_slots = [2 * d for d in range(num_days)]
+        start = _dsatur_color(course_list, conflict_map, num_days, day_slots, {}, course_to_students, seed=args.seed)
+    if start is None:
+        print(f"no DSATUR coloring in {num_days} days; pass a larger --days")
+        return
+    print(f"courses={graph.num_courses} edges={graph.num_edges} days={num_days} "
+          f"start triples={_count_triples(start, day_slots, course_to_students)}")
+
+    print(f"{'encoding':10}{'build':>10}{'constraints':>14}{'solve':>10}{'triples':>10}")
+    for encoding in CP_SAT_CONFLICT_ENCODINGS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            model, _ = _build_triples_model(cp_model, course_list, conflict_map, student_to_courses, {},
+                                            day_slots, conflict_encoding=encoding)
+            t_build = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            result = optimize_triples_cp_sat(course_list, conflict_map, student_to_courses, {}, start, day_slots,
+                                             time_limit_seconds=args.time_limit, workers=args.workers,
+                                             conflict_encoding=encoding)
+            t_total = time.perf_counter() - t0
+        triples = _count_triples(result, day_slots, course_to_students)
+        print(f"{encoding:10}{t_build:>9.2f}s{len(model.Proto().constraints):>14}"
+              f"{t_total - t_build:>9.2f}s{triples:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bench", choices=["enrollment", "conflict", "bitset", "coloring", "cpsat"])
+    parser.add_argument("--courses", type=int, default=3000)
+    parser.add_argument("--students", type=int, default=60000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=0, help="cpsat: day count (default clique bound + 2)")
+    parser.add_argument("--time-limit", type=float, default=10.0,
+                        help="cpsat: solver seconds per encoding; coloring: seconds per exact colorer")
+    parser.add_argument("--workers", type=int, default=8, help="cpsat: CP-SAT search workers")
+    args = parser.parse_args()
+
+    {"enrollment": bench_enrollment, "conflict": bench_conflict, "bitset": bench_bitset,
+     "coloring": bench_coloring, "cpsat": bench_cpsat}[args.bench](args)
+
+
+if __name__ == "__main__":
+    main()
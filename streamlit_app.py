@@ -4,7 +4,7 @@ from streamlit_ui.grid_display import display_schedule_grid
 from streamlit_ui.move_panel import show_move_panel
 from streamlit_ui.calendar_utils import generate_exam_dates
 from app.scheduler import schedule_exams_from_db
-from app.processor import process_uploaded_file
+from app.processor import ingest_upload_pair
 from db.models import Course, Student, CourseStudent
 from db.session import SessionLocal
 
@@ -33,17 +33,24 @@ if regular_file and visitor_file:
     st.success("📤 Uploading and processing files...")
 
     if "uploaded" not in st.session_state:
-        regular_id = process_uploaded_file(regular_file, gender="regular", first_file_id=0)
+        # Regular file first; visitor courses are reconciled against its course ids
+        regular_id, visitor_id = ingest_upload_pair(regular_file, visitor_file)
         st.session_state["regular_xml_id"] = regular_id  # ✅ Save first file ID
-
-        visitor_id = process_uploaded_file(visitor_file, gender="visitor", first_file_id=regular_id)
         st.session_state["visitor_xml_id"] = visitor_id
         st.session_state["uploaded"] = True
         st.session_state["xml_ids"] = [regular_id, visitor_id]
 
     if st.button("📅 Generate Exam Schedule"):
+        progress_bar = st.progress(0.0, text="⏱️ Scheduling…")
+
+        def show_progress(stage, elapsed, total, triples):
+            label = f"⏱️ {stage} ({elapsed:.0f}s of {total:.0f}s)"
+            if triples is not None:
+                label += f" • 3-in-3 cases: {triples}"
+            progress_bar.progress(min(1.0, elapsed / total) if total else 1.0, text=label)
+
         final_df, student_to_courses, course_to_students = schedule_exams_from_db(
-            st.session_state["xml_ids"], start_date, num_days
+            st.session_state["xml_ids"], start_date, num_days, progress=show_progress
         )
         st.session_state["df_schedule"] = final_df
         st.session_state["student_to_courses"] = student_to_courses
@@ -0,0 +1,69 @@
+import os
+import random
+from io import BytesIO
+
+import pytest
+
+# app.scheduler builds its (lazy, never connected) engine at import; give it a well-formed URL
+for name, value in (("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_NAME", "exams"),
+                    ("DB_USER", "test"), ("DB_PASSWORD", "test")):
+    os.environ.setdefault(name, value)
+
+
+class Upload(BytesIO):
+    """In-memory stand-in for a Streamlit upload."""
+    name = "upload.xml"
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """Fresh SQLite database that processor and scheduler open their sessions on."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import processor, scheduler
+    from db.session import Base
+    import db.models  # noqa: F401  (registers the tables)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'exams.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    monkeypatch.setattr(processor, "SessionLocal", factory)
+    monkeypatch.setattr(scheduler, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def random_course_to_students(seed, num_courses=30, num_students=120, max_load=5):
+    """{course_code: {student_id, ...}} with every student in 1..max_load random courses."""
+    rnd = random.Random(seed)
+    courses = [f"C{i:03d}" for i in range(num_courses)]
+    out = {c: set() for c in courses}
+    for s in range(num_students):
+        for c in rnd.sample(courses, rnd.randint(1, max_load)):
+            out[c].add(f"S{s:04d}")
+    return out
+
+
+def colored_instance(seed, day_slots, num_courses=40, num_students=150, max_load=5, fixed=None):
+    """
+    Random dense-id instance with a DSATUR starting coloring:
+    (assignment, course_to_students, student_to_courses, conflict_map, fixed).
+    """
+    from app import scheduler
+    from app.conflict_graph import build_conflict_graph
+    from app.enrollment import Enrollment
+
+    enrollment = Enrollment.from_mapping(random_course_to_students(seed, num_courses, num_students, max_load))
+    conflict_map = build_conflict_graph(enrollment).as_mapping()
+    course_to_students = enrollment.course_members()
+    fixed = {0: day_slots[len(day_slots) // 2]} if fixed is None else fixed
+    assignment = scheduler._dsatur_color(list(range(enrollment.num_courses)), conflict_map, len(day_slots),
+                                         day_slots, fixed, course_to_students, seed=seed, verbose=False)
+    assert assignment is not None
+    return assignment, course_to_students, enrollment.student_members(), conflict_map, fixed
+
+
+def assert_proper(assignment, conflict_map, fixed=()):
+    """No two conflicting courses share a slot and the fixed courses stayed put."""
+    assert all(assignment[n] != slot for c, slot in assignment.items() for n in conflict_map[c] if n in assignment)
+    assert all(assignment[c] == slot for c, slot in dict(fixed).items())
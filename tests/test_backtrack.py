@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from app.scheduler import backtrack_schedule
+from conftest import assert_proper
+
+
+def random_graph(rnd, n, p):
+    """{course: [neighbors]} for a G(n, p) random graph."""
+    neighbors = {c: [] for c in range(n)}
+    for a in range(n):
+        for b in range(a + 1, n):
+            if rnd.random() < p:
+                neighbors[a].append(b)
+                neighbors[b].append(a)
+    return neighbors
+
+
+def brute_force_colorable(free, conflict_map, slot_list, fixed):
+    """Exhaustive search in course order, no pruning beyond the placed neighbors."""
+    assignment = dict(fixed)
+
+    def place(i):
+        if i == len(free):
+            return True
+        c = free[i]
+        for slot in slot_list:
+            if all(assignment.get(n) != slot for n in conflict_map[c]):
+                assignment[c] = slot
+                if place(i + 1):
+                    return True
+                del assignment[c]
+        return False
+
+    return place(0)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_finds_a_coloring_exactly_when_brute_force_does(seed):
+    rnd = random.Random(seed)
+    for k in range(1, 8):
+        for p in (0.3, 0.5, 0.8):
+            n = rnd.randint(k, 10)
+            conflict_map = random_graph(rnd, n, p)
+            slot_list = rnd.sample([2 * d for d in range(k)], k)
+            fixed = dict(zip(rnd.sample(range(n), min(2, k)), rnd.sample(slot_list, min(2, k))))
+            free = [c for c in range(n) if c not in fixed]
+
+            report = {}
+            assignment = backtrack_schedule(free, conflict_map, slot_list, fixed, report=report, verbose=False)
+            assert (assignment is not None) == brute_force_colorable(free, conflict_map, slot_list, fixed), (k, p)
+            if assignment is None:
+                assert report["stop"] == "infeasible"
+            else:
+                assert report["stop"] == "complete"
+                assert sorted(assignment) == list(range(n))
+                assert set(assignment.values()) <= set(slot_list)
+                assert_proper(assignment, conflict_map, fixed)
@@ -0,0 +1,53 @@
+import itertools
+
+import pytest
+
+from app.clique_bound import clique_lower_bound
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+from conftest import random_course_to_students
+
+
+def _chromatic_number(graph):
+    """Smallest k with a proper k-coloring (plain backtracking; small graphs only)."""
+    n = graph.num_courses
+    adjacency = [set(graph.neighbors_of(c).tolist()) for c in range(n)]
+    order = sorted(range(n), key=lambda c: -len(adjacency[c]))
+
+    def colorable(k):
+        colors = {}
+
+        def place(i):
+            if i == n:
+                return True
+            c = order[i]
+            used = {colors[m] for m in adjacency[c] if m in colors}
+            for color in range(min(k, len(colors) + 1)):
+                if color not in used:
+                    colors[c] = color
+                    if place(i + 1):
+                        return True
+                    del colors[c]
+            return False
+
+        return place(0)
+
+    return next(k for k in range(n + 1) if colorable(k))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_bound_is_a_clique_and_at_most_the_chromatic_number(seed):
+    graph = build_conflict_graph(Enrollment.from_mapping(
+        random_course_to_students(seed, num_courses=14, num_students=25, max_load=4)))
+    size, clique, exact = clique_lower_bound(graph)
+
+    assert size == len(clique)
+    for a, b in itertools.combinations(clique, 2):
+        assert b in graph.neighbors_of(a)
+    assert size <= _chromatic_number(graph)
+    assert exact
+
+
+def test_empty_and_edgeless_graphs():
+    assert clique_lower_bound(build_conflict_graph(Enrollment.from_mapping({})))[0] == 0
+    assert clique_lower_bound(build_conflict_graph(Enrollment.from_mapping({"A": {"s1"}, "B": {"s2"}})))[0] == 1
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from app.conflict_graph import _co_enrollment_numpy, _co_enrollment_scipy, build_conflict_graph
+from app.enrollment import Enrollment
+from conftest import random_course_to_students
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scipy_and_numpy_products_agree(seed):
+    pytest.importorskip("scipy")
+    enrollment = Enrollment.from_mapping(random_course_to_students(seed, max_load=6))
+    for got, want in zip(_co_enrollment_numpy(enrollment), _co_enrollment_scipy(enrollment)):
+        np.testing.assert_array_equal(got, want)
+
+
+def test_no_conflicts():
+    enrollment = Enrollment.from_mapping({"A": {"s1"}, "B": {"s2"}})
+    for ptr, neighbors, weights in (_co_enrollment_numpy(enrollment), _co_enrollment_scipy(enrollment)):
+        assert ptr.tolist() == [0, 0, 0]
+        assert len(neighbors) == len(weights) == 0
+
+
+def test_weights_count_shared_students():
+    mapping = random_course_to_students(7)
+    enrollment = Enrollment.from_mapping(mapping)
+    graph = build_conflict_graph(enrollment)
+    keys = enrollment.course_keys
+    for c in range(graph.num_courses):
+        shared = {keys[n]: len(mapping[keys[c]] & mapping[keys[n]]) for n in range(graph.num_courses) if n != c}
+        got = dict(zip((keys[n] for n in graph.neighbors_of(c)), graph.weights[graph.ptr[c]:graph.ptr[c + 1]].tolist()))
+        assert got == {k: w for k, w in shared.items() if w}
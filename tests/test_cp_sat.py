@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip("ortools")
+
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+from app.scheduler import CP_SAT_CONFLICT_ENCODINGS, _count_triples, backtrack_schedule, optimize_triples_cp_sat
+from conftest import assert_proper, random_course_to_students
+
+DAY_SLOTS = [2 * d for d in range(5)]
+
+
+def fewest_triples(num_courses, conflict_map, course_to_students):
+    """Exhaustive minimum over every proper coloring (small instances only)."""
+    assignment, best = {}, [None]
+
+    def place(c):
+        if c == num_courses:
+            triples = _count_triples(assignment, DAY_SLOTS, course_to_students)
+            best[0] = triples if best[0] is None else min(best[0], triples)
+            return
+        for slot in DAY_SLOTS:
+            if all(assignment.get(n) != slot for n in conflict_map[c]):
+                assignment[c] = slot
+                place(c + 1)
+                del assignment[c]
+
+    place(0)
+    return best[0]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 4, 5])
+def test_encodings_reach_the_same_optimum(seed):
+    enrollment = Enrollment.from_mapping(random_course_to_students(seed, num_courses=8, num_students=20, max_load=4))
+    conflict_map = build_conflict_graph(enrollment).as_mapping()
+    course_to_students = enrollment.course_members()
+    course_list = list(range(enrollment.num_courses))
+    start = backtrack_schedule(course_list, conflict_map, DAY_SLOTS, {}, verbose=False)
+    optimum = fewest_triples(enrollment.num_courses, conflict_map, course_to_students)
+    assert optimum > 0
+
+    for encoding in CP_SAT_CONFLICT_ENCODINGS:
+        report = {}
+        result = optimize_triples_cp_sat(course_list, conflict_map, enrollment.student_members(), {}, start,
+                                         DAY_SLOTS, time_limit_seconds=10.0, workers=1,
+                                         conflict_encoding=encoding, report=report, verbose=False)
+        assert report["status"] == "OPTIMAL", encoding
+        assert report["objective"] == optimum, encoding
+        assert _count_triples(result, DAY_SLOTS, course_to_students) == optimum, encoding
+        assert_proper(result, conflict_map)
+
+
+@pytest.mark.parametrize("encoding", CP_SAT_CONFLICT_ENCODINGS)
+@pytest.mark.parametrize("heavier", ["A", "B"])
+def test_profile_weights_decide_whose_triple_goes(encoding, heavier):
+    # Course M is shared: on day 1 it completes A's days 0-1-2, on day 4 B's days 3-4-5;
+    # the fixed A1/A2 (days 0, 2) and B1/B2 (days 3, 5) rule out every other day for M
+    day_slots = [2 * d for d in range(6)]
+    students = {"A": ["M", "A1", "A2"], "B": ["M", "B1", "B2"]}
+    course_to_students = {c: set() for c in ["M", "A1", "A2", "B1", "B2"]}
+    for profile, courses in students.items():
+        for k in range(2 if profile == heavier else 1):
+            for c in courses:
+                course_to_students[c].add(f"{profile}{k}")
+    enrollment = Enrollment.from_mapping(course_to_students)
+    conflict_map = build_conflict_graph(enrollment).as_mapping()
+    ids = enrollment.course_index
+    fixed = {ids["A1"]: day_slots[0], ids["A2"]: day_slots[2], ids["B1"]: day_slots[3], ids["B2"]: day_slots[5]}
+    worse = day_slots[4] if heavier == "B" else day_slots[1]  # start with the heavier profile's triple
+    start = {**fixed, ids["M"]: worse}
+
+    result = optimize_triples_cp_sat(list(range(enrollment.num_courses)), conflict_map, enrollment.student_members(),
+                                     fixed, start, day_slots, time_limit_seconds=10.0, workers=1,
+                                     conflict_encoding=encoding, verbose=False)
+    assert result[ids["M"]] == (day_slots[1] if heavier == "B" else day_slots[4])
+    assert _count_triples(result, day_slots, enrollment.course_members()) == 1
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from app import scheduler
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+from conftest import assert_proper, colored_instance, random_course_to_students
+
+DAY_SLOTS = [2 * d for d in range(16)]
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_recolor_returns_a_proper_coloring_on_the_kept_days_or_none(seed):
+    assignment, course_to_students, _, conflict_map, fixed = colored_instance(seed, DAY_SLOTS)
+    order = random.Random(seed).sample(DAY_SLOTS, len(DAY_SLOTS))
+    recolored = 0
+    for days in range(len(DAY_SLOTS) - 1, 0, -1):
+        keep = order[:days]
+        candidate, swaps = scheduler._recolor_removed_days(assignment, keep, conflict_map, course_to_students, fixed)
+        assert swaps >= 0
+        if candidate is None:
+            continue
+        recolored += 1
+        assert sorted(candidate) == sorted(assignment)
+        assert all(sl in keep for c, sl in candidate.items() if c not in fixed)
+        assert_proper(candidate, conflict_map, fixed)
+    assert recolored > 0
+
+
+def test_minimize_days_walks_down_to_a_proper_coloring():
+    enrollment = Enrollment.from_mapping(random_course_to_students(3, num_courses=40, num_students=150, max_load=5))
+    graph = build_conflict_graph(enrollment)
+    state = {
+        "course_list": list(range(enrollment.num_courses)),
+        "conflict_map": graph.as_mapping(),
+        "course_to_students": enrollment.course_members(),
+        "weighted_degrees": graph.weighted_degrees,
+        "fixed_slot_assignment": {0: DAY_SLOTS[0]},
+    }
+    hi = len(DAY_SLOTS)
+    order = DAY_SLOTS
+    assignment = scheduler._color_restart(state, hi, order, seed=0, verbose=False)
+    triples = scheduler._count_triples(assignment, order, state["course_to_students"])
+
+    days, best, best_triples = scheduler.minimize_days(state, assignment, triples, order, 0, 1, hi)
+    assert days < hi
+    assert set(best.values()) <= set(order[:days])
+    assert_proper(best, state["conflict_map"], state["fixed_slot_assignment"])
+    assert best_triples == scheduler._count_triples(best, order[:days], state["course_to_students"])
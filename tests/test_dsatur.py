@@ -0,0 +1,46 @@
+import multiprocessing
+
+import pytest
+
+from app import scheduler
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+from conftest import assert_proper, random_course_to_students
+
+DAY_SLOTS = [2 * d for d in range(12)]
+
+
+def instance(seed):
+    enrollment = Enrollment.from_mapping(random_course_to_students(seed, num_courses=40, num_students=150, max_load=5))
+    graph = build_conflict_graph(enrollment)
+    return list(range(enrollment.num_courses)), graph, enrollment.course_members(), {0: DAY_SLOTS[6]}
+
+
+def color(seed, upper_bound=None, report=None):
+    course_list, graph, course_to_students, fixed = instance(seed)
+    return scheduler._dsatur_color(course_list, graph.as_mapping(), len(DAY_SLOTS), DAY_SLOTS, fixed,
+                                   course_to_students, seed=seed, weighted_degrees=graph.weighted_degrees,
+                                   upper_bound=upper_bound, report=report, verbose=False)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("shared", [False, True])
+def test_upper_bound_prunes_or_returns_a_coloring_within_it(seed, shared):
+    course_list, graph, course_to_students, fixed = instance(seed)
+    unbounded = {}
+    assert color(seed, report=unbounded) is not None
+    assert unbounded["triples"] > 0
+
+    for limit in range(-1, unbounded["triples"] + 2):
+        report = {}
+        assignment = color(seed, multiprocessing.RawValue("i", limit) if shared else limit, report)
+        if assignment is None:
+            assert report["stop"] == "bound"
+            assert 0 <= limit < report["triples"]
+        else:
+            assert report["stop"] == "complete"
+            assert report["triples"] == scheduler._count_triples(assignment, DAY_SLOTS, course_to_students)
+            assert limit < 0 or report["triples"] <= limit
+            assert_proper(assignment, graph.as_mapping(), fixed)
+        # The bound only cuts the same greedy run short: it survives exactly when it is not beaten
+        assert (assignment is None) == (0 <= limit < unbounded["triples"])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.enrollment import Enrollment
+from conftest import random_course_to_students
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_from_mapping_round_trips(seed):
+    mapping = random_course_to_students(seed)
+    enrollment = Enrollment.from_mapping(mapping)
+
+    assert enrollment.num_courses == len(mapping)
+    assert dict(enrollment.course_key_mapping()) == mapping
+    student_to_courses = {}
+    for c, students in mapping.items():
+        for s in students:
+            student_to_courses.setdefault(s, set()).add(c)
+    assert dict(enrollment.student_key_mapping()) == student_to_courses
+
+
+def test_both_directions_agree():
+    enrollment = Enrollment.from_mapping(random_course_to_students(3))
+    by_course = {(c, s) for c, students in enrollment.course_members().items() for s in students}
+    by_student = {(c, s) for s, courses in enrollment.student_members().items() for c in courses}
+    assert by_course == by_student
+    assert len(by_course) == enrollment.num_memberships
+    for members in (enrollment.course_members(), enrollment.student_members()):
+        for row in members.values():
+            assert row == sorted(set(row))
+
+
+def test_from_pairs_drops_duplicates():
+    enrollment = Enrollment.from_pairs(["a", "b"], ["x", "y", "z"], [1, 0, 1, 0, 1], [2, 0, 2, 1, 0])
+    assert enrollment.course_members()[0] == [0, 1]
+    assert enrollment.course_members()[1] == [0, 2]
+    assert enrollment.student_members()[2] == [1]
+
+
+def test_to_arrays_rebuilds_the_same_enrollment():
+    enrollment = Enrollment.from_mapping(random_course_to_students(4))
+    arrays = enrollment.to_arrays()
+    copy = Enrollment(enrollment.course_keys, enrollment.student_keys, arrays["course_ptr"],
+                      arrays["course_students"], arrays["student_ptr"], arrays["student_courses"])
+    assert dict(copy.course_key_mapping()) == dict(enrollment.course_key_mapping())
+    assert all(a.dtype == np.int32 for a in arrays.values())
+
+
+def test_map_courses_unions_students():
+    enrollment = Enrollment.from_mapping({"A-1": {"s1"}, "A-2": {"s2", "s1"}, "B": {"s3"}})
+    merged = enrollment.map_courses(lambda key: key.split("-")[0])
+    assert dict(merged.course_key_mapping()) == {"A": {"s1", "s2"}, "B": {"s3"}}
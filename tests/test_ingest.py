@@ -0,0 +1,156 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app import processor
+from db.models import Course, CourseStudent, IgnoredCourse, Student, XMLFile
+from conftest import Upload, random_course_to_students
+
+
+def regular_xml(seed=0):
+    """Regular-campus export: one G_SEMESTER per course, codes with stray spaces, a blank student id."""
+    mapping = random_course_to_students(seed, num_courses=39, num_students=220, max_load=4)
+    out = ["<ROOT><LIST_G_SEMESTER>"]
+    for i, (code, students) in enumerate(mapping.items()):
+        out.append(f"<G_SEMESTER><COURSE_CODE> {code[:2]} {code[2:]} </COURSE_CODE>"
+                    f"<COURSE_NAME> Course {i} </COURSE_NAME><SECTION>{i % 3}</SECTION><LIST_G_STUDENT_ID>")
+        for stu in sorted(students) + ["", sorted(students)[0]]:  # blank id and a repeated student
+            out.append(f"<G_STUDENT_ID><STUDENT_ID1>{stu}</STUDENT_ID1>"
+                       f"<STUDENT_NAME_S> Name {stu} </STUDENT_NAME_S><MAJOR_DESC>CS</MAJOR_DESC></G_STUDENT_ID>")
+        out.append("</LIST_G_STUDENT_ID></G_SEMESTER>")
+    out.append("</LIST_G_SEMESTER></ROOT>")
+    return "".join(out).encode()
+
+
+def baseline_rows(xml, ignored=()):
+    """Rows the original DOM-based insert_xml_data wrote for a regular upload."""
+    courses, students, links = {}, {}, set()
+    for g_semester in ET.fromstring(xml).iter("G_SEMESTER"):
+        code = g_semester.findtext("COURSE_CODE", "").strip().replace(" ", "")
+        if not code or code in ignored:
+            continue
+        courses.setdefault(code, (g_semester.findtext("COURSE_NAME", "").strip(),
+                                  g_semester.findtext("SECTION", "").strip()))
+        for g_student in g_semester.find("LIST_G_STUDENT_ID").findall("G_STUDENT_ID"):
+            sid = g_student.findtext("STUDENT_ID1", "").strip()
+            if sid:
+                students.setdefault(sid, (g_student.findtext("STUDENT_NAME_S", "").strip(),
+                                          g_student.findtext("MAJOR_DESC", "").strip()))
+                links.add((code, sid))
+    return courses, students, links
+
+
+def stored_rows(db, xml_file_id):
+    courses = {code: (name, section) for code, name, section in
+               db.query(Course.course_code, Course.course_name, Course.section)
+               .filter(Course.xml_file_id == xml_file_id)}
+    students = {sid: (name, major) for sid, name, major in
+                db.query(Student.student_id1, Student.name, Student.major)
+                .filter(Student.xml_file_id == xml_file_id)}
+    links = (db.query(Course.course_code, Student.student_id1)
+             .join(CourseStudent, CourseStudent.course_id == Course.id)
+             .join(Student, CourseStudent.student_id == Student.id)
+             .filter(Student.xml_file_id == xml_file_id).all())
+    return courses, students, links
+
+
+def test_regular_upload_matches_the_baseline_rows(session_factory):
+    xml = regular_xml()
+    xml_file_id = processor.process_uploaded_file(Upload(xml), "regular", None)
+
+    db = session_factory()
+    courses, students, links = stored_rows(db, xml_file_id)
+    want_courses, want_students, want_links = baseline_rows(xml)
+    assert (len(courses), len(students), len(links)) == (39, 220, len(want_links))
+    assert courses == want_courses
+    assert students == want_students
+    assert sorted(links) == sorted(want_links)  # no duplicate enrollments either
+    db.close()
+
+
+def test_small_batches_write_the_same_rows(session_factory):
+    xml = regular_xml(seed=1)
+    db = session_factory()
+    xml_file_id = processor.insert_xml_data(Upload(xml), gender="regular", filename="small.xml", db=db,
+                                            first_file_id=None, batch_size=7)
+    courses, students, links = stored_rows(db, xml_file_id)
+    want_courses, want_students, want_links = baseline_rows(xml)
+    assert (courses, students, sorted(links)) == (want_courses, want_students, sorted(want_links))
+    db.close()
+
+
+def visitor_xml():
+    """Visitor export: one ACADEMIC_RECORDS per student, codes suffixed '(F)', some unknown to the regular file."""
+    records = {f"V{s:03d}": [f"C{(s * 7 + k) % 45:03d}" for k in range(3)] for s in range(60)}
+    out = ["<ROOT>"]
+    for sid, codes in records.items():
+        out.append(f"<ACADEMIC_RECORDS><STUDENT_ID>{sid}</STUDENT_ID><STUDENT_NAME>Visitor {sid}</STUDENT_NAME>"
+                   f"<MAJOR_NAME>IS</MAJOR_NAME><LIST_G>")
+        for code in codes + codes[:1]:  # a repeated course
+            out.append(f"<G_STUDENT_ID1><COURSE_CODE>{code[:2]} {code[2:]}(F)</COURSE_CODE>"
+                       f"<COURSE_NAME>Visiting {code}</COURSE_NAME><SECTION>9</SECTION></G_STUDENT_ID1>")
+        out.append("</LIST_G></ACADEMIC_RECORDS>")
+    out.append("</ROOT>")
+    return "".join(out).encode(), records
+
+
+def test_visitor_upload_reuses_regular_course_rows(session_factory):
+    regular_id = processor.process_uploaded_file(Upload(regular_xml()), "regular", None)
+    xml, records = visitor_xml()
+    visitor_id = processor.process_uploaded_file(Upload(xml), "visitor", regular_id)
+
+    db = session_factory()
+    regular_ids = dict(db.query(Course.course_code, Course.id).filter(Course.xml_file_id == regular_id))
+    visitor_courses = dict(db.query(Course.course_code, Course.id).filter(Course.xml_file_id == visitor_id))
+    all_codes = {code for codes in records.values() for code in codes}
+    assert set(visitor_courses) == all_codes - set(regular_ids)  # only codes the regular file lacks
+
+    links = (db.query(Student.student_id1, Course.course_code, Course.id)
+             .join(CourseStudent, CourseStudent.student_id == Student.id)
+             .join(Course, CourseStudent.course_id == Course.id)
+             .filter(Student.xml_file_id == visitor_id).all())
+    assert len(links) == len({(sid, code) for sid, code, _ in links})
+    assert {(sid, code) for sid, code, _ in links} == {(sid, code) for sid, codes in records.items() for code in codes}
+    assert all(course_id == regular_ids.get(code, visitor_courses.get(code)) for _, code, course_id in links)
+    db.close()
+
+
+def test_identical_upload_hits_the_cache(session_factory):
+    xml = regular_xml()
+    first = processor.process_uploaded_file(Upload(xml), "regular", None)
+    again = processor.process_uploaded_file(Upload(xml), "regular", None)
+
+    db = session_factory()
+    assert again == first
+    assert db.query(XMLFile).count() == 1
+    assert db.query(XMLFile.content_hash).filter(XMLFile.id == first).scalar()
+    db.close()
+
+
+def test_changed_ignored_codes_miss_the_cache(session_factory):
+    xml = regular_xml()
+    first = processor.process_uploaded_file(Upload(xml), "regular", None)
+
+    db = session_factory()
+    db.add(IgnoredCourse(course_code="C 005", reason="no exam"))
+    db.commit()
+    second = processor.process_uploaded_file(Upload(xml), "regular", None)
+
+    assert second != first
+    courses, _, links = stored_rows(db, second)
+    assert courses == baseline_rows(xml, ignored={"C005"})[0]
+    assert "C005" not in courses and all(code != "C005" for code, _ in links)
+    assert processor.process_uploaded_file(Upload(xml), "regular", None) == second
+    db.close()
+
+
+def test_failed_upload_leaves_no_rows(session_factory):
+    regular_id = processor.process_uploaded_file(Upload(regular_xml()), "regular", None)
+    xml, _ = visitor_xml()
+    with pytest.raises(ET.ParseError):
+        processor.ingest_upload_pair(Upload(regular_xml()), Upload(xml[:len(xml) // 2]))
+
+    db = session_factory()
+    assert [row.id for row in db.query(XMLFile.id)] == [regular_id]
+    assert db.query(Student).filter(Student.xml_file_id != regular_id).count() == 0
+    db.close()
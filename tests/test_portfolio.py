@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from app import scheduler
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+from conftest import random_course_to_students
+
+DAY_SLOTS = [2 * d for d in range(12)]
+
+
+def restart_state(seed=0):
+    enrollment = Enrollment.from_mapping(random_course_to_students(seed, num_courses=40, num_students=150, max_load=5))
+    graph = build_conflict_graph(enrollment)
+    return {
+        "course_list": list(range(enrollment.num_courses)),
+        "conflict_map": graph.as_mapping(),
+        "course_to_students": enrollment.course_members(),
+        "weighted_degrees": graph.weighted_degrees,
+        "fixed_slot_assignment": {0: DAY_SLOTS[6]},
+        "slot_orders": [DAY_SLOTS, DAY_SLOTS[::-1]],
+    }
+
+
+@pytest.fixture
+def pooled(monkeypatch):
+    """Every portfolio run uses the pool, however small the instance or cheap the restarts."""
+    monkeypatch.setattr(scheduler, "PORTFOLIO_MIN_COURSES", 0)
+    monkeypatch.setattr(scheduler, "_POOL_STARTUP_MS", -1)
+    yield
+    scheduler.shutdown_portfolio_pool()
+
+
+def test_shared_state_round_trips_and_reuses_memory_mapped_files(tmp_path):
+    state = restart_state()
+    ptr, members = state["course_to_students"].arrays()
+    np.save(tmp_path / "ptr.npy", ptr)
+    np.save(tmp_path / "members.npy", members)
+    state["course_to_students"] = scheduler.CSRMapping(np.load(tmp_path / "ptr.npy", mmap_mode="r"),
+                                                       np.load(tmp_path / "members.npy", mmap_mode="r"))
+    shared_dir = tmp_path / "shared"
+    shared_dir.mkdir()
+
+    shared = scheduler._share_state(state, str(shared_dir))
+    assert shared["csr"]["course_to_students"] == (str(tmp_path / "ptr.npy"), str(tmp_path / "members.npy"))
+    assert sorted(p.name for p in shared_dir.iterdir()) == [
+        "conflict_map_members.npy", "conflict_map_ptr.npy", "weighted_degrees.npy"]
+
+    attached = scheduler._portfolio_state(shared)
+    for key in ("conflict_map", "course_to_students"):
+        assert dict(attached[key]) == dict(state[key])
+    assert np.array_equal(attached["weighted_degrees"], state["weighted_degrees"])
+    assert attached["fixed_slot_assignment"] == state["fixed_slot_assignment"]
+
+
+def test_pool_matches_in_process_and_is_reused(pooled):
+    state = restart_state()
+    jobs = [(order_idx, seed) for seed in range(3) for order_idx in range(2)]
+    want = scheduler.run_restart_portfolio(state, jobs, 12, workers=1)
+    assert want[1] is not None
+
+    for _ in range(2):
+        got = scheduler.run_restart_portfolio(state, jobs, 12, workers=2)
+        assert (got[0], got[2], got[3]) == (want[0], want[2], want[3])
+        assert got[1] == want[1]
+    executor = scheduler._POOL["executor"]
+    scheduler.run_restart_portfolio(restart_state(seed=1), jobs, 12, workers=2)
+    assert scheduler._POOL["executor"] is executor
+
+
+def test_cheap_restarts_stay_in_process(monkeypatch):
+    monkeypatch.setattr(scheduler, "PORTFOLIO_MIN_COURSES", 0)
+    monkeypatch.setattr(scheduler, "_POOL_STARTUP_MS", 60_000)
+    scheduler.shutdown_portfolio_pool()
+    best = scheduler.run_restart_portfolio(restart_state(), [(0, 0), (1, 0), (0, 1)], 12, workers=2)
+    assert best[1] is not None
+    assert "executor" not in scheduler._POOL
@@ -0,0 +1,61 @@
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+from app.scheduler import ScheduleState, _count_triples
+from conftest import colored_instance
+
+DAY_SLOTS = [2 * d for d in range(12)]
+
+
+def recount(assignment, course_to_students):
+    """windows and course_weight from scratch: per student, every run of three taken days."""
+    slot_to_day = {s: d for d, s in enumerate(DAY_SLOTS)}
+    days = defaultdict(set)
+    for c, sl in assignment.items():
+        for stu in course_to_students[c]:
+            days[stu].add(slot_to_day[sl])
+    windows, course_weight = {}, defaultdict(int)
+    for stu, taken in days.items():
+        starts = [d for d in taken if {d + 1, d + 2} <= taken]
+        if starts:
+            windows[stu] = sum(1 << d for d in starts)
+    for c, sl in assignment.items():
+        d = slot_to_day[sl]
+        course_weight[c] = sum(1 for stu in course_to_students[c] if stu in windows
+                               for start in range(max(0, d - 2), d + 1) if windows[stu] >> start & 1)
+    return windows, course_weight
+
+
+def random_conflict_free_move(rnd, state, conflict_map, fixed):
+    """{course: new_slot} for one or two courses that leaves the assignment proper."""
+    movable = [c for c in state.assignment if c not in fixed]
+    while True:
+        moves = {c: rnd.choice(DAY_SLOTS) for c in rnd.sample(movable, rnd.randint(1, 2))}
+        after = {**state.assignment, **moves}
+        if all(after[n] != after[c] for c in moves for n in conflict_map[c]):
+            return moves
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_incremental_bookkeeping_matches_a_full_recount(seed):
+    rnd = random.Random(seed)
+    assignment, course_to_students, student_to_courses, conflict_map, fixed = colored_instance(seed, DAY_SLOTS)
+    state = ScheduleState(DAY_SLOTS, dict(assignment), course_to_students, student_to_courses)
+    total = state.triple_count()
+    assert total == _count_triples(assignment, DAY_SLOTS, course_to_students)
+
+    for _ in range(150):
+        moves = random_conflict_free_move(rnd, state, conflict_map, fixed)
+        delta = state.moves_delta(moves)
+        state.move_courses(moves)
+        total += delta
+        assert total == state.triple_count() == _count_triples(state.assignment, DAY_SLOTS, course_to_students)
+
+        windows, course_weight = recount(state.assignment, course_to_students)
+        assert state.windows == windows
+        assert {c: w for c, w in state.course_weight.items() if w} == {c: w for c, w in course_weight.items() if w}
+        assert +state.slot_load == Counter(state.assignment.values())
+        assert {sl: set(cs) for sl, cs in state.slot_courses.items() if cs} == {
+            sl: {c for c, at in state.assignment.items() if at == sl} for sl in set(state.assignment.values())}
@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+from app import snapshot_cache
+from app.conflict_graph import build_conflict_graph
+from app.enrollment import Enrollment
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _snapshot():
+    raw = Enrollment.from_mapping({("A1", None): {"s1", "s2"}, ("B2", "Bio"): {"s2"}, ("B2", "Bio 2"): {"s3"}})
+    merged = raw.map_courses(lambda key: key[0])
+    return snapshot_cache.EnrollmentSnapshot(
+        raw, {10: ("A1", None), 11: ("B2", "Bio")}, {"s1": None, "s2": "Sam", "s3": "Sue"},
+        merged, build_conflict_graph(merged),
+    )
+
+
+def test_save_then_load_round_trips():
+    snap = _snapshot()
+    snapshot_cache.save_snapshot([2, 1], "fp", snap)
+    got = snapshot_cache.load_snapshot([1, 2], "fp")
+
+    assert got.raw_enrollment.course_keys == snap.raw_enrollment.course_keys
+    assert got.raw_enrollment.student_keys == snap.raw_enrollment.student_keys
+    assert dict(got.enrollment.course_key_mapping()) == dict(snap.enrollment.course_key_mapping())
+    assert got.course_map == snap.course_map
+    assert got.student_names == snap.student_names  # None names survive
+    assert dict(got.conflict_graph.as_mapping()) == dict(snap.conflict_graph.as_mapping())
+    assert got.conflict_graph.weights.tolist() == snap.conflict_graph.weights.tolist()
+
+
+def test_stale_fingerprint_invalidates():
+    snapshot_cache.save_snapshot([1], "old", _snapshot())
+    assert snapshot_cache.load_snapshot([1], "new") is None
+    assert not os.path.exists(snapshot_cache._entry_dir([1]))
+
+
+def test_missing_or_corrupt_entries_are_misses():
+    assert snapshot_cache.load_snapshot([1], "fp") is None
+
+    snapshot_cache.save_snapshot([1], "fp", _snapshot())
+    os.remove(os.path.join(snapshot_cache._entry_dir([1]), "conflict_ptr.npy"))
+    assert snapshot_cache.load_snapshot([1], "fp") is None
+
+    snapshot_cache.save_snapshot([1], "fp", _snapshot())
+    with open(os.path.join(snapshot_cache._entry_dir([1]), "raw_course_ptr.npy"), "wb") as f:
+        f.write(b"not an array")
+    assert snapshot_cache.load_snapshot([1], "fp") is None
+
+    with open(os.path.join(snapshot_cache._entry_dir([1]), "meta.json"), "w") as f:
+        f.write("{")
+    assert snapshot_cache.load_snapshot([1], "fp") is None
+
+
+def test_evict_keeps_most_recently_used(snapshot_dir):
+    for i, ids in enumerate(([1], [2], [3])):
+        snapshot_cache.save_snapshot(ids, "fp", _snapshot())
+        os.utime(snapshot_cache._entry_dir(ids), (1000 + i, 1000 + i))
+    snapshot_cache.load_snapshot([1], "fp")  # touch: now the most recent
+
+    snapshot_cache.evict_snapshots(max_entries=2, max_bytes=1 << 30)
+    assert sorted(os.listdir(snapshot_dir)) == sorted([snapshot_cache.snapshot_key([1]), snapshot_cache.snapshot_key([3])])
+
+    snapshot_cache.evict_snapshots(max_entries=8, max_bytes=1)
+    assert os.listdir(snapshot_dir) == [snapshot_cache.snapshot_key([1])]  # the newest always stays
+
+
+def test_fingerprint_follows_the_uploads_not_the_rows(session_factory):
+    from app import processor, scheduler
+    from conftest import Upload
+    from db.models import MergedCourse
+    from test_ingest import regular_xml
+
+    first = processor.process_uploaded_file(Upload(regular_xml(seed=0)), "regular", None)
+    second = processor.process_uploaded_file(Upload(regular_xml(seed=1)), "regular", None)
+    fingerprint = scheduler.enrollment_fingerprint([first], {})
+    assert fingerprint == scheduler.enrollment_fingerprint([first], {})
+    assert fingerprint != scheduler.enrollment_fingerprint([first, second], {})
+    assert fingerprint != scheduler.enrollment_fingerprint([first], {"G1": {"C001", "C002"}})
+
+    cold, _, _ = scheduler.prepare_enrollment([first])
+    warm, _, _ = scheduler.prepare_enrollment([first])
+    assert isinstance(warm.enrollment.course_ptr, np.memmap)  # served from disk
+    assert dict(warm.enrollment.course_key_mapping()) == dict(cold.enrollment.course_key_mapping())
+
+    db = session_factory()
+    db.add(MergedCourse(group_id="G1", course_code="C001"))
+    db.add(MergedCourse(group_id="G1", course_code="C002"))
+    db.commit()
+    db.close()
+    regrouped, _, _ = scheduler.prepare_enrollment([first])
+    assert not isinstance(regrouped.enrollment.course_ptr, np.memmap)
+    assert regrouped.enrollment.num_courses == cold.enrollment.num_courses - 1
@@ -0,0 +1,19 @@
+import pytest
+
+from app import scheduler
+from conftest import assert_proper, colored_instance
+
+DAY_SLOTS = [2 * d for d in range(12)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_tabu_keeps_the_schedule_valid_and_never_worsens(seed):
+    assignment, course_to_students, student_to_courses, conflict_map, fixed = colored_instance(seed, DAY_SLOTS)
+    start = scheduler._count_triples(assignment, DAY_SLOTS, course_to_students)
+    result, triples = scheduler.tabu_search_triples(
+        assignment, course_to_students, student_to_courses, conflict_map, DAY_SLOTS,
+        fixed_slot_assignment=fixed, time_limit_seconds=0.5, seed=seed)
+
+    assert_proper(result, conflict_map, fixed)
+    assert triples == scheduler._count_triples(result, DAY_SLOTS, course_to_students)
+    assert triples <= start